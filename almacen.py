@@ -0,0 +1,153 @@
+"""Almacén de datasets compartido entre sesiones, indexado por huella de contenido"""
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_SIN_USO = 4  # Datasets sin sesiones activas que se conservan (LRU)
+TTL_SIN_USO = 3600  # Segundos que se conserva un dataset sin sesiones activas
+
+
+class Prestamo:
+    """Referencia de una sesión a un dataset del almacén
+
+    Los datos son de solo lectura y se comparten con las demás sesiones. La
+    referencia se descuenta al llamar a `liberar` o, si la sesión se cierra
+    sin hacerlo, cuando el préstamo se recolecta junto con su session_state.
+    """
+
+    def __init__(self, almacen, clave, datos):
+        self.clave = clave
+        self.datos = datos
+        self._finalizador = weakref.finalize(self, almacen._soltar, clave)
+
+    def liberar(self):
+        """Descuenta la referencia (solo la primera vez)"""
+        self._finalizador()
+
+
+class _Entrada:
+    def __init__(self, datos):
+        self.datos = datos
+        self.referencias = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class _Construccion:
+    """Construcción en curso que otras sesiones pueden esperar"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+
+
+class AlmacenDatasets:
+    """Una sola copia de cada dataset procesado para todo el proceso
+
+    Las sesiones que suben el mismo archivo reciben la misma copia; si lo
+    suben a la vez, solo una lo procesa y las demás esperan su resultado.
+    Los datasets sin referencias se desalojan por antigüedad y por cantidad,
+    así la memoria crece con los archivos distintos y no con los usuarios.
+    """
+
+    def __init__(self, max_sin_uso=MAX_SIN_USO, ttl_sin_uso=TTL_SIN_USO):
+        self.max_sin_uso = max_sin_uso
+        self.ttl_sin_uso = ttl_sin_uso
+        self._entradas = OrderedDict()
+        self._en_construccion = {}
+        self._lock = threading.Lock()
+        # Claves soltadas por finalizadores pendientes de descontar; ver _soltar
+        self._soltadas = queue.SimpleQueue()
+
+    @contextmanager
+    def _bloqueado(self):
+        # Toma el lock y descuenta antes y después los préstamos soltados
+        with self._lock:
+            self._descontar_soltadas()
+            yield
+            self._descontar_soltadas()
+
+    def prestar(self, clave, construir):
+        """Préstamo del dataset `clave`; lo construye con `construir()` si no existe
+
+        Devuelve None si la construcción devuelve None (datos inválidos); en
+        ese caso no se guarda nada y el siguiente intento vuelve a construir.
+        """
+        while True:
+            with self._bloqueado():
+                entrada = self._entradas.get(clave)
+                if entrada is not None:
+                    entrada.referencias += 1
+                    entrada.ultimo_uso = time.monotonic()
+                    self._entradas.move_to_end(clave)
+                    return Prestamo(self, clave, entrada.datos)
+                construccion = self._en_construccion.get(clave)
+                propietario = construccion is None
+                if propietario:
+                    construccion = self._en_construccion[clave] = _Construccion()
+
+            if not propietario:
+                # Otra sesión ya está procesando el mismo archivo
+                construccion.evento.wait()
+                continue
+
+            datos = None
+            try:
+                datos = construir()
+            finally:
+                with self._bloqueado():
+                    del self._en_construccion[clave]
+                    if datos is not None:
+                        entrada = self._entradas[clave] = _Entrada(datos)
+                        entrada.referencias = 1
+                        self._desalojar()
+                construccion.evento.set()
+            return Prestamo(self, clave, datos) if datos is not None else None
+
+    def _soltar(self, clave):
+        # Lo llama el finalizador del préstamo, también desde el recolector de
+        # ciclos, que puede correr en este mismo hilo con el lock tomado: solo
+        # se encola la clave y se descuenta ahora únicamente si el lock está libre
+        self._soltadas.put(clave)
+        if self._lock.acquire(blocking=False):
+            try:
+                self._descontar_soltadas()
+            finally:
+                self._lock.release()
+
+    def _descontar_soltadas(self):
+        # Se llama con el lock tomado
+        soltadas = False
+        while True:
+            try:
+                clave = self._soltadas.get_nowait()
+            except queue.Empty:
+                break
+            soltadas = True
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                entrada.referencias -= 1
+                entrada.ultimo_uso = time.monotonic()
+        if soltadas:
+            self._desalojar()
+
+    def _desalojar(self):
+        # Se llama con el lock tomado; recorre de más antiguo a más reciente
+        ahora = time.monotonic()
+        sin_uso = [clave for clave, entrada in self._entradas.items() if entrada.referencias <= 0]
+        sobrantes = len(sin_uso) - self.max_sin_uso
+        for clave in sin_uso:
+            if sobrantes > 0 or ahora - self._entradas[clave].ultimo_uso > self.ttl_sin_uso:
+                del self._entradas[clave]
+                sobrantes -= 1
+
+    def referencias(self, clave):
+        """Sesiones que usan actualmente el dataset `clave`"""
+        with self._bloqueado():
+            entrada = self._entradas.get(clave)
+            return entrada.referencias if entrada is not None else 0
+
+    def __len__(self):
+        with self._bloqueado():
+            return len(self._entradas)
@@ -5,423 +5,269 @@ import streamlit as st
 import pandas as pd
 import folium
 from streamlit_folium import st_folium
-from folium.plugins import Draw, Search, LocateControl, Fullscreen, MarkerCluster
-from shapely.geometry import Point, Polygon, shape
-from fpdf import FPDF
+from folium.plugins import Search, MarkerCluster
 from datetime import datetime
-import matplotlib.pyplot as plt
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import time
+import json
+import uuid
 import base64
-from io import BytesIO
-import tempfile
-import unicodedata
+from contextlib import nullcontext
 from streamlit_searchbox import st_searchbox
+from espacial import huella_zona
+from geocodificacion import Geocodificador, ESTADO_ORIGINAL
+from ingesta import huella_contenido, ColumnasFaltantesError
+from sedes import RegistroSedes, SEDES_FIJAS
+from graficas import graficas_reporte, graficas_dashboard
+from almacen import AlmacenDatasets
+from densidad import PiramideDensidad, tamano_celda
+from areas import CatalogoAreas, COLUMNA_AREA
+from motor import cargar_dataset, version_dataset, filtrar, analizar_zona, crear_pdf, datos_para_mapa, filas_capa_colaboradores
+from tiempos import Cronometro
+from mapas import TILES, crear_mapa_base, capa_sedes, capa_colaboradores, capa_densidad
 
 # Configuración de la página
 st.set_page_config(page_title="Sistema de Continuidad", layout="wide")
 st.title("🚨 Mapa de Continuidad del Negocio")
 
 # Límites para optimización
-MAX_MARKERS = 3000  # Máximo de marcadores en el mapa
-
-# ---------- CONFIGURACIÓN DE MAPAS ----------
-TILES = {
-    "MapLibre": {
-        "url": "https://api.maptiler.com/maps/streets/{z}/{x}/{y}.png?key=dhEAG0dMVs2vmsaHdReR",
-        "attr": '<a href="https://www.maptiler.com/copyright/" target="_blank">© MapTiler</a>'
-    },
-    "OpenStreetMap": {
-        "url": "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
-        "attr": 'OpenStreetMap'
-    }
-}
-
-# ---------- SEDES FIJAS ----------
-SEDES_FIJAS = {
-    "Colmédica Belaire": {
-        "direccion": "Centro Comercial Belaire Plaza, Cl. 153 #6-65, Bogotá",
-        "coordenadas": [4.729454000113993, -74.02444216931787],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Bulevar Niza": {
-        "direccion": "Centro Comercial Bulevar Niza, Av. Calle 58 #127-59, Bogotá",
-        "coordenadas": [4.712693239837536, -74.07140074602322],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Calle 185": {
-        "direccion": "Centro Comercial Santafé, Cl. 185 #45-03, Bogotá",
-        "coordenadas": [4.763543959141223, -74.04612616931786],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Cedritos": {
-        "direccion": "Edificio HHC, Cl. 140 #11-45, Bogotá",
-        "coordenadas": [4.718879348342116, -74.03609218650581],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Chapinero": {
-        "direccion": "Cr. 7 #52-53, Chapinero, Bogotá",
-        "coordenadas": [4.640908410923512, -74.06373898409286],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Colina Campestre": {
-        "direccion": "Centro Comercial Sendero de la Colina, Cl. 151 #54-15, Bogotá",
-        "coordenadas": [4.73397996072128, -74.05613864417634],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Centro Médico Colmédica Country Park": {
-        "direccion": "Autopista Norte No 122 - 96, Bogotá",
-        "coordenadas": [4.670067290638234, -74.05758327116473],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Metrópolis": {
-        "direccion": "Centro Comercial Metrópolis, Av. Cra. 68 #75A-50, Bogotá",
-        "coordenadas": [4.6812256618088615, -74.08315698409288],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Multiplaza": {
-        "direccion": "Centro Comercial Multiplaza, Cl. 19A #72-57, Bogotá",
-        "coordenadas": [4.652573284106405, -74.12629091534289],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Plaza Central": {
-        "direccion": "Centro Comercial Plaza Central, Cra. 65 #11-50, Bogotá",
-        "coordenadas": [4.633464230539147, -74.11621916981814],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Salitre Capital": {
-        "direccion": "Capital Center II, Av. Cl. 26 #69C-03, Bogotá",
-        "coordenadas": [4.660602588141229, -74.10864383068576],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Suba": {
-        "direccion": "Alpaso Plaza, Av. Cl. 145 #103B-69, Bogotá",
-        "coordenadas": [4.7499608085787575, -74.08737693178564],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Centro Médico Torre Santa Bárbara": {
-        "direccion": "Autopista Norte No 122 - 96, Bogotá",
-        "coordenadas": [4.70404406297091, -74.053790252428],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Unicentro Occidente": {
-        "direccion": "Centro Comercial Unicentro Occidente, Cra. 111C #86-05, Bogotá",
-        "coordenadas": [4.724354935414492, -74.11430016931786],
-        "color": "blue",
-        "icono": "hospital"
-    },
-    "Colmédica Usaquén": {
-        "direccion": "Centro Comercial Usaquén, Cra. 7 #120-20, Bogotá",
-        "coordenadas": [4.6985109910547695, -74.03076183068214],
-        "color": "blue",
-        "icono": "hospital"
-    }
-}
+MAX_MARKERS = 3000  # Máximo de marcadores individuales en el mapa
+MAX_PUNTOS_CAPA = 100000  # Máximo de puntos en la capa única de colaboradores
+MAX_COMBINACIONES_FILTROS = 32  # Combinaciones de filtros recientes en memoria
+MAX_REPORTES_EN_CACHE = 64  # Reportes de impacto recientes en memoria
+MODO_CAPA_UNICA = "Capa única (rápida)"
+MODO_INDIVIDUALES = "Marcadores individuales"
+MODO_DENSIDAD = "Densidad por zonas"
 
 # ---------- FUNCIONES ----------
-def remove_accents(input_str):
-    """Elimina acentos de los caracteres"""
-    nfkd_form = unicodedata.normalize('NFKD', input_str)
-    return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
-
-@st.cache_data(ttl=3600)
-def load_data(uploaded_file):
-    """Carga y limpia el archivo CSV optimizado"""
+def medir(etapa):
+    """Mide la etapa en el cronómetro de la ejecución si el panel de tiempos está activo"""
+    cronometro = st.session_state.get("cronometro")
+    return cronometro.etapa(etapa) if cronometro is not None else nullcontext()
+
+def cronometro_de_fragmento(primera_etapa):
+    """Cronómetro activo; si el fragmento se re-ejecuta solo, empieza uno nuevo
+
+    En una ejecución completa el fragmento aún no midió `primera_etapa`; si ya
+    está medida, la app no se volvió a ejecutar y las demás etapas son viejas.
+    """
+    cronometro = st.session_state.get("cronometro")
+    if cronometro is not None and primera_etapa in cronometro.etapas:
+        cronometro = st.session_state.cronometro = Cronometro()
+    return cronometro
+
+def panel_tiempos(cronometro):
+    """Latencia por etapa y tamaño del mapa de la ejecución actual"""
+    with st.expander("⏱️ Tiempos de esta ejecución", expanded=True):
+        tabla = cronometro.tabla()
+        st.caption(f"Total medido: {tabla['ms'].sum():.0f} ms" +
+                   "".join(f" · {nombre}: {valor}" for nombre, valor in cronometro.datos.items()))
+        st.dataframe(tabla, hide_index=True)
+
+@st.cache_resource
+def registro_sedes_por_defecto():
+    """Registro de sedes a partir de SEDES_FIJAS"""
+    return RegistroSedes.desde_diccionario(SEDES_FIJAS)
+
+@st.cache_resource(max_entries=8)
+def cargar_registro_sedes(contenido, nombre_archivo):
+    """Registro de sedes desde un CSV o GeoJSON subido"""
+    return RegistroSedes.desde_archivo(contenido, nombre_archivo)
+
+@st.cache_data
+def datos_capa_sedes(version, _registro):
+    """Filas de la capa de sedes, calculadas una vez por versión del catálogo"""
+    return _registro.datos_capa()
+
+def barra_geocodificacion():
+    """Barra de avance de la geocodificación masiva y su callback de progreso"""
+    barra = st.progress(0.0, text="🌎 Geocodificando direcciones sin coordenadas...")
+    def progreso(hechas, total):
+        # A una consulta por segundo cada paso cuenta; con la caché, solo cada 1 %
+        if hechas == total or hechas % max(1, total // 100) == 0:
+            barra.progress(hechas / total, text=f"🌎 Geocodificando direcciones sin coordenadas: {hechas} de {total}")
+    return barra, progreso
+
+def load_data(contenido, geocodificar=False, huella=None, areas=None):
+    """Carga y limpia el archivo CSV completo (el análisis nunca usa muestras)"""
     try:
-        # Lectura del archivo
-        if uploaded_file.size > 10 * 1024 * 1024:  # Si pesa más de 10MB
-            chunks = pd.read_csv(uploaded_file, chunksize=500)
-            df = pd.concat(chunks)
-        else:
-            df = pd.read_csv(uploaded_file)
-
-        # Validación de columnas
-        required_cols = ["Nombre", "Dirección", "Sede asignada", "Teléfono", 
-                        "Ciudad", "Subproceso", "Criticidad", "Latitud", "Longitud"]
-        if not all(col in df.columns for col in required_cols):
-            st.error("El archivo no tiene las columnas requeridas")
-            return None
-        
-        # Limpieza de datos
-        df = df.dropna(subset=["Latitud", "Longitud"])
-        df["Latitud"] = pd.to_numeric(df["Latitud"], errors="coerce")
-        df["Longitud"] = pd.to_numeric(df["Longitud"], errors="coerce")
-        df = df.dropna(subset=["Latitud", "Longitud"])
-        df = df[(df["Latitud"].between(-90, 90)) & (df["Longitud"].between(-180, 180))]
+        barra, progreso = barra_geocodificacion() if geocodificar else (None, None)
+        try:
+            carga = cargar_dataset(contenido, obtener_geocodificador() if geocodificar else None, huella, areas,
+                                   progreso=progreso)
+        finally:
+            if barra is not None:
+                barra.empty()
         
-        # Muestra representativa si es muy grande
-        if len(df) > MAX_MARKERS:
-            st.info(f"🔍 Mostrando muestra de {MAX_MARKERS} de {len(df)} registros")
-            return df.sample(MAX_MARKERS)
-        return df
-    
+        estados = carga["geocodificacion"]
+        if estados is not None:
+            resumen = estados[estados != ESTADO_ORIGINAL].value_counts()
+            if not resumen.empty:
+                st.info("🌎 Geocodificación de filas sin coordenadas: " +
+                        ", ".join(f"{estado}: {total}" for estado, total in resumen.items()))
+        return carga
+    
+    except ColumnasFaltantesError:
+        st.error("El archivo no tiene las columnas requeridas")
+        return None
     except Exception as e:
         st.error(f"Error al cargar datos: {str(e)}")
         return None
 
-def crear_mapa_base(location=[4.5709, -74.2973], zoom_start=12, tile_provider="MapLibre"):
-    """Crea mapa base optimizado"""
-    m = folium.Map(
-        location=location,
-        zoom_start=zoom_start,
-        tiles=TILES[tile_provider]["url"],
-        attr=TILES[tile_provider]["attr"],
-        control_scale=True,
-        prefer_canvas=True
-    )
-    
-    LocateControl(auto_start=False).add_to(m)
-    Fullscreen().add_to(m)
-    
-    Draw(
-        export=True,
-        position="topleft",
-        draw_options={
-            'polyline': False,
-            'rectangle': True,
-            'polygon': True,
-            'circle': True,
-            'marker': False
-        }
-    ).add_to(m)
-    
-    return m
+@st.cache_resource(max_entries=8)
+def cargar_areas(contenido):
+    """Catálogo de áreas administrativas desde un GeoJSON subido"""
+    return CatalogoAreas.desde_geojson(contenido)
 
-def aplicar_filtros(df, ciudad, criticidad, subproceso):
-    """Aplica filtros al dataframe"""
-    filtered_df = df.copy()
-    
-    if ciudad and ciudad != "Todas":
-        filtered_df = filtered_df[filtered_df["Ciudad"] == ciudad]
-    
-    if criticidad and criticidad != "Todas":
-        filtered_df = filtered_df[filtered_df["Criticidad"] == criticidad]
-    
-    if subproceso and subproceso != "Todos":
-        filtered_df = filtered_df[filtered_df["Subproceso"] == subproceso]
+@st.cache_resource
+def almacen_datasets():
+    """Almacén de rosters procesados compartido por todas las sesiones"""
+    return AlmacenDatasets()
+
+def dataset_de_sesion(archivo, geocodificar, areas=None):
+    """Dataset del archivo subido, tomado del almacén compartido
+
+    Los bytes se hashean una vez por archivo subido (no en cada rerun) y la
+    sesión guarda solo su préstamo; cambiar de archivo o quitarlo lo libera.
+    """
+    prestamo = st.session_state.get("prestamo_dataset")
+    if archivo is None:
+        if prestamo is not None:
+            prestamo.liberar()
+            del st.session_state.prestamo_dataset
+        return None
     
-    return filtered_df
+    subida = st.session_state.get("subida_roster")
+    if subida is None or subida["file_id"] != archivo.file_id:
+        subida = {"file_id": archivo.file_id, "huella": huella_contenido(archivo.getvalue())}
+        st.session_state.subida_roster = subida
+    
+    # La clave del almacén es la misma versión que devuelve la carga, así el
+    # préstamo y las cachés indexadas con carga["version"] cambian juntos
+    clave = version_dataset(subida["huella"], geocodificar, areas)
+    if prestamo is None or prestamo.clave != clave:
+        if prestamo is not None:
+            prestamo.liberar()
+            del st.session_state.prestamo_dataset
+        # Si otra sesión procesa el mismo archivo, esta espera su resultado
+        with st.spinner("Procesando el archivo..."):
+            prestamo = almacen_datasets().prestar(
+                clave, lambda: load_data(archivo.getvalue(), geocodificar, huella=subida["huella"], areas=areas)
+            )
+        if prestamo is None:
+            return None
+        st.session_state.prestamo_dataset = prestamo
+    return prestamo.datos
+
+@st.cache_data(max_entries=MAX_COMBINACIONES_FILTROS)
+def datos_capa_colaboradores(version, filtros, maximo, _df, _indice, _filas):
+    """Filas de la capa y tamaño de su carga útil, memoizados por versión del dataset, filtros y límite"""
+    datos = filas_capa_colaboradores(datos_para_mapa(_df, _indice, maximo, _filas))
+    return datos, len(json.dumps(datos))
+
+@st.cache_resource(max_entries=MAX_COMBINACIONES_FILTROS)
+def piramide_filtrada(version, filtros, _df, _filas):
+    """Pirámide de densidad de las filas filtradas, una por versión del dataset y combinación de filtros"""
+    filtrado = _df.iloc[_filas]
+    return PiramideDensidad(filtrado["Latitud"], filtrado["Longitud"], filtrado["Criticidad"])
+
+def vista_mapa():
+    """Zoom y caja visible (sur, oeste, norte, este) que reportó el mapa en el último rerun"""
+    vista = st.session_state.get("mapa_principal") or {}
+    limites = vista.get("bounds") or {}
+    suroeste = limites.get("_southWest") or {}
+    noreste = limites.get("_northEast") or {}
+    if suroeste.get("lat") is None or noreste.get("lat") is None:
+        return vista.get("zoom") or 12, -90.0, -180.0, 90.0, 180.0
+    return vista.get("zoom") or 12, suroeste["lat"], suroeste["lng"], noreste["lat"], noreste["lng"]
+
+@st.cache_data(max_entries=MAX_COMBINACIONES_FILTROS)
+def aplicar_filtros(version, ciudad, criticidad, subproceso, area, _indice_filtros):
+    """Posiciones de fila que cumplen los filtros, memoizadas por dataset y combinación
+
+    `version` es carga["version"]: contenido, geocodificación y catálogo de
+    áreas. Las demás cachés del dataset se indexan con la misma versión.
+    """
+    return filtrar(_indice_filtros, ciudad, criticidad, subproceso, area)
+
+@st.cache_resource
+def obtener_geocodificador():
+    """Cliente de geocodificación único compartido por todas las sesiones"""
+    return Geocodificador()
+
+def indices_direcciones_activos():
+    """Índices locales de direcciones: catálogo de sedes y roster de la sesión"""
+    indices = [st.session_state.get("registro_sedes", registro_sedes_por_defecto()).direcciones]
+    if st.session_state.get("prestamo_dataset") is not None:
+        indices.append(st.session_state.prestamo_dataset.datos["direcciones"])
+    return indices
 
 def buscar_direccion_colombia(direccion):
-    """Geocodificación optimizada"""
+    """Geocodificación: primero direcciones conocidas, luego servicio con caché"""
+    for indice in indices_direcciones_activos():
+        conocida = indice.exacta(direccion)
+        if conocida:
+            return conocida
     try:
-        geolocator = Nominatim(
-            user_agent="continuidad_app",
-            timeout=10,
-            country_codes="co"
-        )
-        location = geolocator.geocode(f"{direccion}, Colombia", exactly_one=True)
+        resultados = obtener_geocodificador().buscar(f"{direccion}, Colombia")
+        location = resultados[0] if resultados else None
         return location if location and "Colombia" in location.address else None
     except Exception:
         return None
 
-def generar_reporte(zona_dibujada, df, sedes_fijas):
-    """Genera reporte con geometrías simplificadas"""
-    if not zona_dibujada or 'geometry' not in zona_dibujada:
-        return None
-    
+def sugerir_direcciones(searchterm):
+    """Sugerencias de direcciones: índice local primero, Nominatim si no hay"""
+    locales = []
+    for indice in indices_direcciones_activos() if searchterm else []:
+        locales += indice.buscar(searchterm, limite=5 - len(locales))
+        if len(locales) >= 5:
+            break
+    if locales:
+        return [loc.address for loc in locales]
+    canal = st.session_state.get("canal_autocompletado")
+    if canal is None:
+        canal = st.session_state.canal_autocompletado = uuid.uuid4().hex
+    return [loc.address for loc in obtener_geocodificador().sugerir(searchterm, canal=canal)]
+
+@st.cache_data(max_entries=MAX_REPORTES_EN_CACHE)
+def reporte_en_cache(huella, version, version_sedes, filtros, _zona_dibujada, _carga, _sedes, _filas):
+    """Reporte de impacto memoizado por zona, filtros activos y versiones del dataset y de sedes"""
     try:
-        zona_shape = shape(zona_dibujada['geometry'])
-        
-        def round_coords(x, y):
-            return (round(x, 5), round(y, 5))
-        
-        colaboradores_afectados = []
-        for _, row in df.iterrows():
-            punto = Point(round_coords(row["Longitud"], row["Latitud"]))
-            if zona_shape.contains(punto):
-                colaboradores_afectados.append(row)
-        
-        sedes_afectadas = []
-        for nombre, datos in sedes_fijas.items():
-            punto = Point(round_coords(datos["coordenadas"][1], datos["coordenadas"][0]))
-            if zona_shape.contains(punto):
-                sedes_afectadas.append({
-                    "Nombre": nombre,
-                    "Dirección": datos["direccion"],
-                    "Coordenadas": datos["coordenadas"]
-                })
-        
-        return {
-            "total_colaboradores": len(colaboradores_afectados),
-            "total_sedes": len(sedes_afectadas),
-            "colaboradores_afectados": pd.DataFrame(colaboradores_afectados),
-            "sedes_afectadas": pd.DataFrame(sedes_afectadas),
-            "zona": zona_dibujada
-        }
-    
+        reporte = analizar_zona(_zona_dibujada, _carga, _sedes, _filas)
     except Exception as e:
         st.error(f"Error al generar reporte: {str(e)}")
         return None
+    if reporte:
+        reporte["clave"] = (huella, version, version_sedes, filtros)
+    return reporte
 
-def generar_graficas(reporte):
-    """Genera gráficas para el reporte"""
-    fig, ax = plt.subplots(1, 3, figsize=(15, 5))
-    
-    if not reporte["sedes_afectadas"].empty:
-        reporte["sedes_afectadas"]["Nombre"].value_counts().plot(
-            kind='bar', ax=ax[0], color='salmon')
-        ax[0].set_title('Sedes Afectadas', fontsize=10)
-        ax[0].tick_params(axis='x', rotation=45, labelsize=8)
-    
-    if not reporte["colaboradores_afectados"].empty:
-        reporte["colaboradores_afectados"]["Criticidad"].value_counts().plot(
-            kind='pie', ax=ax[1], autopct='%1.1f%%', textprops={'fontsize': 8})
-        ax[1].set_title('Distribución por Criticidad', fontsize=10)
-    
-    if not reporte["colaboradores_afectados"].empty:
-        reporte["colaboradores_afectados"]["Subproceso"].value_counts().head(5).plot(
-            kind='barh', ax=ax[2], color='lightgreen')
-        ax[2].set_title('Top 5 Subprocesos Afectados', fontsize=10)
-    
-    plt.tight_layout()
-    return fig
+def clave_filtros(*selecciones):
+    """Forma canónica (hashable y sin orden) del estado de los filtros"""
+    return tuple(tuple(sorted(seleccion)) for seleccion in selecciones)
 
-def generar_graficas_pdf(reporte):
-    """Genera gráficas optimizadas para PDF"""
-    figuras = []
-    
-    if not reporte["sedes_afectadas"].empty:
-        fig1, ax1 = plt.subplots(figsize=(8, 4))
-        reporte["sedes_afectadas"]["Nombre"].value_counts().plot(
-            kind='bar', ax=ax1, color='salmon')
-        ax1.set_title('Sedes Afectadas', fontsize=12)
-        ax1.tick_params(axis='x', rotation=45, labelsize=10)
-        plt.tight_layout()
-        figuras.append(fig1)
-    
-    if not reporte["colaboradores_afectados"].empty:
-        fig2, ax2 = plt.subplots(figsize=(8, 4))
-        reporte["colaboradores_afectados"]["Criticidad"].value_counts().plot(
-            kind='pie', ax=ax2, autopct='%1.1f%%', textprops={'fontsize': 10})
-        ax2.set_title('Distribución por Criticidad', fontsize=12)
-        plt.tight_layout()
-        figuras.append(fig2)
-    
-    if not reporte["colaboradores_afectados"].empty:
-        fig3, ax3 = plt.subplots(figsize=(8, 4))
-        reporte["colaboradores_afectados"]["Subproceso"].value_counts().head(5).plot(
-            kind='barh', ax=ax3, color='lightgreen')
-        ax3.set_title('Top 5 Subprocesos Afectados', fontsize=12)
-        ax3.tick_params(axis='both', labelsize=10)
-        plt.tight_layout()
-        figuras.append(fig3)
-    
-    return figuras
+@st.cache_data(max_entries=MAX_REPORTES_EN_CACHE)
+def graficas_en_cache(clave, _reporte):
+    """PNG de las gráficas de un reporte, renderizadas una vez por identidad del reporte"""
+    return graficas_reporte(_reporte)
+
+@st.cache_data(max_entries=8)
+def graficas_dashboard_en_cache(version, _cubo):
+    """PNG de las gráficas del dashboard, renderizadas una vez por versión del dataset"""
+    return graficas_dashboard(_cubo)
 
-def crear_pdf(reporte, tipo_evento, descripcion_emergencia=""):
-    """Crea un PDF con el reporte de emergencia"""
+def crear_pdf_sesion(reporte, tipo_evento, descripcion_emergencia="", graficas=None):
+    """PDF del reporte con la ubicación de emergencia buscada en la sesión"""
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(200, 10, txt="REPORTE DE EMERGENCIA - COLMÉDICA", ln=1, align='C')
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=1)
-        pdf.ln(10)
-        
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="Información del Evento", ln=1)
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Tipo de evento: {remove_accents(tipo_evento)}", ln=1)
-        
-        descripcion_simple = remove_accents(descripcion_emergencia)
-        pdf.multi_cell(0, 10, txt=f"Descripción: {descripcion_simple}")
-        pdf.ln(10)
-        
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="Resumen de la Emergencia", ln=1)
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Total colaboradores afectados: {reporte['total_colaboradores']}", ln=1)
-        pdf.cell(200, 10, txt=f"Total sedes afectadas: {reporte['total_sedes']}", ln=1)
-        
-        if 'emergencia_location' in st.session_state:
-            ubicacion_simple = remove_accents(st.session_state.emergencia_location['address'])
-            pdf.cell(200, 10, txt=f"Ubicación: {ubicacion_simple}", ln=1)
-        pdf.ln(10)
-        
-        figuras_pdf = generar_graficas_pdf(reporte)
-        
-        temp_files = []
-        try:
-            for fig in figuras_pdf:
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmpfile:
-                    fig.savefig(tmpfile.name, dpi=150, bbox_inches='tight')
-                    temp_files.append(tmpfile.name)
-                plt.close(fig)
-            
-            for temp_file in temp_files:
-                pdf.add_page()
-                pdf.image(temp_file, x=10, w=190)
-        finally:
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
-        
-        if not reporte["sedes_afectadas"].empty:
-            pdf.add_page()
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(200, 10, txt="Sedes Afectadas", ln=1)
-            pdf.set_font("Arial", size=10)
-            
-            for _, row in reporte["sedes_afectadas"].iterrows():
-                nombre_simple = remove_accents(row['Nombre'])
-                direccion_simple = remove_accents(row['Dirección'])
-                pdf.multi_cell(0, 6, txt=f"- {nombre_simple}: {direccion_simple}")
-                pdf.ln(2)
-        
-        if not reporte["colaboradores_afectados"].empty:
-            pdf.add_page()
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(200, 10, txt="Colaboradores Afectados (primeros 50)", ln=1)
-            pdf.set_font("Arial", size=8)
-            
-            pdf.set_fill_color(200, 220, 255)
-            pdf.cell(60, 6, "Nombre", 1, 0, 'C', True)
-            pdf.cell(50, 6, "Sede", 1, 0, 'C', True)
-            pdf.cell(50, 6, "Subproceso", 1, 0, 'C', True)
-            pdf.cell(30, 6, "Criticidad", 1, 1, 'C', True)
-            
-            pdf.set_fill_color(255, 255, 255)
-            for _, row in reporte["colaboradores_afectados"].head(50).iterrows():
-                nombre_simple = remove_accents(row['Nombre'])[:25]
-                sede_simple = remove_accents(row['Sede asignada'])[:20]
-                subproceso_simple = remove_accents(row['Subproceso'])[:20]
-                
-                pdf.cell(60, 6, txt=nombre_simple, border=1)
-                pdf.cell(50, 6, txt=sede_simple, border=1)
-                pdf.cell(50, 6, txt=subproceso_simple, border=1)
-                pdf.cell(30, 6, txt=str(row['Criticidad']), border=1, ln=1)
-        
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_pdf:
-            pdf.output(tmp_pdf.name)
-            tmp_pdf.seek(0)
-            pdf_bytes = tmp_pdf.read()
-        
-        return pdf_bytes
-    
+        ubicacion = st.session_state.emergencia_location["address"] if "emergencia_location" in st.session_state else None
+        return crear_pdf(reporte, tipo_evento, descripcion_emergencia, graficas, ubicacion)
     except Exception as e:
         st.error(f"Error al generar el PDF: {str(e)}")
         return None
 
+@st.cache_data(max_entries=MAX_REPORTES_EN_CACHE)
+def enlace_csv_en_cache(clave, filename, _df):
+    """Enlace de descarga memoizado por reporte y archivo"""
+    return get_table_download_link(_df, filename)
+
 def get_table_download_link(df, filename="reporte.csv"):
     """Genera un enlace para descargar un dataframe como CSV"""
     csv = df.to_csv(index=False)
@@ -433,28 +279,58 @@ def get_table_download_link(df, filename="reporte.csv"):
 with st.sidebar:
     st.header("⚙️ Configuración")
     tile_provider = st.selectbox("Seleccionar tipo de mapa", list(TILES.keys()), index=0)
+    modo_marcadores = st.radio("Marcadores de colaboradores", [MODO_CAPA_UNICA, MODO_INDIVIDUALES, MODO_DENSIDAD], index=0)
+    analizar_todas = st.checkbox("🗺️ Analizar todas las zonas dibujadas", value=False,
+                                 help="Un solo reporte con el desglose por zona en lugar de solo la última dibujada")
+    mostrar_tiempos = st.checkbox("⏱️ Mostrar tiempos por etapa", value=False,
+                                  help="Latencia de cada etapa y tamaño del mapa en esta ejecución")
+    # Un cronómetro nuevo por ejecución completa de la app
+    st.session_state.cronometro = Cronometro() if mostrar_tiempos else None
+    
+    archivo_sedes = st.file_uploader("🏥 Catálogo de sedes (CSV o GeoJSON)", type=["csv", "geojson", "json"])
+    registro = registro_sedes_por_defecto()
+    if archivo_sedes:
+        try:
+            registro = cargar_registro_sedes(archivo_sedes.getvalue(), archivo_sedes.name)
+        except Exception as e:
+            st.error(f"Error al cargar el catálogo de sedes: {str(e)}")
+    st.session_state.registro_sedes = registro
+    st.caption(f"{len(registro)} sedes en el catálogo")
     
     st.header("🔍 Filtros")
     archivo = st.file_uploader("📄 Subir CSV de colaboradores", type="csv")
-    
-    if archivo and 'df' in st.session_state:
-        df = st.session_state.df
-        ciudades = ["Todas"] + sorted(df["Ciudad"].unique().tolist())
-        criticidades = ["Todas"] + sorted(df["Criticidad"].unique().tolist())
-        subprocesos = ["Todos"] + sorted(df["Subproceso"].unique().tolist())
-        
-        ciudad = st.selectbox("Ciudad", ciudades, index=0)
-        criticidad = st.selectbox("Criticidad", criticidades, index=0)
-        subproceso = st.selectbox("Subproceso", subprocesos, index=0)
+    archivo_areas = st.file_uploader("🏙️ Límites administrativos (GeoJSON)", type=["geojson", "json"],
+                                     help="Localidades o municipios; cada colaborador se asigna a su área al cargar")
+    areas = None
+    if archivo_areas:
+        try:
+            areas = cargar_areas(archivo_areas.getvalue())
+        except Exception as e:
+            st.error(f"Error al cargar las áreas: {str(e)}")
+    geocodificar = st.checkbox("🌎 Geocodificar filas sin coordenadas", value=False,
+                               help="Busca la dirección de las filas sin Latitud/Longitud válidas (1 consulta por segundo)")
+    
+    with medir("Carga del roster"):
+        carga = dataset_de_sesion(archivo, geocodificar, areas)
+    df = carga["df"] if carga is not None else None
+    if carga is not None:
+        sesiones = almacen_datasets().referencias(st.session_state.prestamo_dataset.clave)
+        if sesiones > 1:
+            st.caption(f"👥 Roster compartido con {sesiones - 1} sesión(es) más")
+    
+    # Selección múltiple; vacía equivale a "Todas"
+    ciudad, criticidad, subproceso, area = [], [], [], []
+    if df is not None:
+        cubo = carga["cubo"]
+        ciudad = st.multiselect("Ciudad", cubo.opciones("Ciudad"), placeholder="Todas")
+        criticidad = st.multiselect("Criticidad", cubo.opciones("Criticidad"), placeholder="Todas")
+        subproceso = st.multiselect("Subproceso", cubo.opciones("Subproceso"), placeholder="Todos")
+        if COLUMNA_AREA in df.columns:
+            area = st.multiselect(COLUMNA_AREA, cubo.opciones(COLUMNA_AREA), placeholder="Todas")
     
     with st.sidebar.expander("🔍 BUSCAR DIRECCIÓN EN COLOMBIA", expanded=True):
         direccion = st_searchbox(
-            lambda searchterm: [loc.address for loc in 
-                             Nominatim(user_agent="autocomplete").geocode(
-                                 f"{searchterm}, Colombia", 
-                                 exactly_one=False, 
-                                 limit=5
-                             )] if searchterm and len(searchterm) > 3 else [],
+            sugerir_direcciones,
             label="🔍 Buscar dirección:",
             placeholder="Ej: Carrera 15 #32-41, Bogotá",
             key="direccion_autocomplete"
@@ -473,61 +349,108 @@ with st.sidebar:
                     else:
                         st.error("Dirección no encontrada")
 
-# Mapa principal
-m = crear_mapa_base(tile_provider=tile_provider)
-
-# Mostrar sedes fijas
-for nombre, datos in SEDES_FIJAS.items():
-    folium.Marker(
-        location=datos["coordenadas"],
-        popup=f"<b>{nombre}</b><br>{datos['direccion']}",
-        icon=folium.Icon(color=datos["color"], icon=datos["icono"], prefix='fa')
-    ).add_to(m)
-
-# Procesar archivo subido
-if archivo:
-    df = load_data(archivo)
-    
-    if df is not None:
-        st.session_state.df = df
-        df_filtrado = aplicar_filtros(df, ciudad, criticidad, subproceso)
-        
-        marker_cluster = MarkerCluster(
-            name="Colaboradores",
-            max_cluster_radius=50,
-            disable_clustering_at_zoom=14
-        ).add_to(m)
+# Cada panel es un fragmento: un widget dentro de él solo vuelve a ejecutar ese
+# panel. Los widgets de la barra lateral (datos, filtros, búsqueda) siguen
+# ejecutando la app completa porque cambian lo que muestran todos los paneles.
+@st.fragment
+def panel_mapa(tile_provider, registro, carga, filas_filtradas, modo_marcadores, analizar_todas, filtros):
+    """Mapa con sedes y colaboradores; calcula el reporte de la zona dibujada"""
+    cronometro = cronometro_de_fragmento("Mapa: base y sedes")
+    with medir("Mapa: base y sedes"):
+        m = crear_mapa_base(tile_provider=tile_provider)
         
-        for _, row in df_filtrado.iterrows():
-            folium.Marker(
-                location=[row["Latitud"], row["Longitud"]],
-                popup=f"<b>{row['Nombre']}</b><br>Sede: {row['Sede asignada']}<br>Subproceso: {row['Subproceso']}<br>Criticidad: {row['Criticidad']}",
-                icon=folium.Icon(icon='user', prefix='fa', color='lightblue')
-            ).add_to(marker_cluster)
+        # Mostrar sedes en una sola capa
+        capa_sedes(datos_capa_sedes(registro.version, registro)).add_to(m)
+    
+    capa_unica = modo_marcadores == MODO_CAPA_UNICA
+    densidad = modo_marcadores == MODO_DENSIDAD
+    capas_dinamicas = []
+    payload = 0
+    if carga is not None:
+        df = carga["df"]
+        maximo = MAX_PUNTOS_CAPA if capa_unica else MAX_MARKERS
+        with medir("Mapa: colaboradores"):
+            if densidad:
+                # Solo las celdas de la vista actual; al mover el mapa se reemplaza la capa sin recargarlo
+                piramide = carga["densidad"] if len(filas_filtradas) == len(df) else \
+                    piramide_filtrada(carga["version"], filtros, df, filas_filtradas)
+                zoom, celdas = piramide.celdas(*vista_mapa())
+                capa, payload = capa_densidad(celdas)
+                capas_dinamicas.append(capa)
+                mostrados = len(filas_filtradas)
+                st.caption(f"🟧 Densidad: {len(celdas)} celdas de {tamano_celda(zoom) * 111:.2f} km aprox.")
+            elif capa_unica:
+                datos, payload = datos_capa_colaboradores(carga["version"], filtros, maximo, df, carga["indice"], filas_filtradas)
+                capa_colaboradores(datos).add_to(m)
+                mostrados = len(datos)
+            else:
+                df_mapa = datos_para_mapa(df, carga["indice"], maximo, filas_filtradas)
+                mostrados = len(df_mapa)
+                marker_cluster = MarkerCluster(
+                    name="Colaboradores",
+                    max_cluster_radius=50,
+                    disable_clustering_at_zoom=14
+                ).add_to(m)
+                
+                for _, row in df_mapa.iterrows():
+                    folium.Marker(
+                        location=[row["Latitud"], row["Longitud"]],
+                        popup=f"<b>{row['Nombre']}</b><br>Sede: {row['Sede asignada']}<br>Subproceso: {row['Subproceso']}<br>Criticidad: {row['Criticidad']}",
+                        icon=folium.Icon(icon='user', prefix='fa', color='lightblue')
+                    ).add_to(marker_cluster)
         
-        if hasattr(st.session_state, 'emergencia_location'):
-            folium.Marker(
-                location=st.session_state.emergencia_location["coords"],
-                popup=f"🚨 EMERGENCIA\n{st.session_state.emergencia_location['address']}",
-                icon=folium.Icon(color='red', icon='exclamation-triangle', prefix='fa')
-            ).add_to(m)
-            m.location = st.session_state.emergencia_location["coords"]
-
-# Mostrar mapa
-mapa_interactivo = st_folium(m, width=1200, height=600, key="mapa_principal")
-
-# Generar reporte si se dibuja una zona
-if mapa_interactivo.get("last_active_drawing"):
-    zona_dibujada = mapa_interactivo["last_active_drawing"]
-    if archivo and df is not None:
-        reporte = generar_reporte(zona_dibujada, df_filtrado, SEDES_FIJAS)
+        if mostrados < len(filas_filtradas):
+            st.info(f"🔍 Mostrando en el mapa {mostrados} de {len(filas_filtradas)} registros; el análisis usa todos")
+        if capa_unica:
+            st.caption(f"🗺️ Capa de colaboradores: {mostrados} puntos, {payload / 1024:.0f} KB")
+    
+    if hasattr(st.session_state, 'emergencia_location'):
+        folium.Marker(
+            location=st.session_state.emergencia_location["coords"],
+            popup=f"🚨 EMERGENCIA\n{st.session_state.emergencia_location['address']}",
+            icon=folium.Icon(color='red', icon='exclamation-triangle', prefix='fa')
+        ).add_to(m)
+        m.location = st.session_state.emergencia_location["coords"]
+    
+    if cronometro is not None:
+        # HTML del mapa que se envía al navegador más la capa de densidad, que va aparte
+        cronometro.anotar("Carga útil del mapa", f"{(len(m.get_root().render()) + (payload if densidad else 0)) / 1024:.0f} KB")
+    
+    # Solo los dibujos vuelven a Python: mover o acercar el mapa no provoca reruns
+    # (salvo en modo densidad, que necesita la vista para elegir las celdas)
+    objetos = ["all_drawings", "last_active_drawing"] + (["zoom", "bounds"] if densidad else [])
+    with medir("Mapa: envío al navegador"):
+        mapa_interactivo = st_folium(m, width=1200, height=600, key="mapa_principal",
+                                     returned_objects=objetos, feature_group_to_add=capas_dinamicas or None)
+    
+    # Generar reporte si se dibuja una zona (o con todas las dibujadas)
+    zonas_dibujadas = mapa_interactivo.get("all_drawings") or []
+    if analizar_todas and zonas_dibujadas:
+        zona_dibujada = {"type": "FeatureCollection", "features": zonas_dibujadas}
+    else:
+        zona_dibujada = mapa_interactivo.get("last_active_drawing")
+    if zona_dibujada and carga is not None:
+        with medir("Reporte"):
+            reporte = reporte_en_cache(
+                huella_zona(zona_dibujada), carga["version"], registro.version, filtros,
+                zona_dibujada, carga, registro, filas_filtradas
+            )
         
         if reporte:
             st.session_state.reporte_emergencia = reporte
             st.success(f"Zona de emergencia identificada con {reporte['total_colaboradores']} colaboradores y {reporte['total_sedes']} sedes afectadas")
+    
+    # Anidado: un dibujo nuevo lo actualiza, pero sus propios widgets solo lo re-ejecutan a él
+    panel_reporte()
+    
+    if cronometro is not None:
+        panel_tiempos(cronometro)
 
-# Mostrar reporte si existe
-if 'reporte_emergencia' in st.session_state:
+@st.fragment
+def panel_reporte():
+    """Reporte de la última zona analizada, con exportación a PDF"""
+    if 'reporte_emergencia' not in st.session_state:
+        return
     reporte = st.session_state.reporte_emergencia
     
     st.subheader("📝 Reporte de Emergencia")
@@ -555,45 +478,82 @@ if 'reporte_emergencia' in st.session_state:
     col2.metric("Total Sedes Afectadas", reporte["total_sedes"])
     
     st.subheader("📊 Estadísticas de la Emergencia")
-    fig_emergencia = generar_graficas(reporte)
-    st.pyplot(fig_emergencia)
+    with medir("Gráficas del reporte"):
+        graficas = graficas_en_cache(reporte["clave"], reporte)
+    for columna, png in zip(st.columns(3), graficas.values()):
+        columna.image(png, use_container_width=True)
+    
+    if "zonas" in reporte:
+        st.subheader("🗺️ Desglose por Zona")
+        st.dataframe(reporte["zonas"], hide_index=True)
+    
+    if not reporte.get("areas_afectadas", pd.DataFrame()).empty:
+        st.subheader("🏙️ Áreas Afectadas")
+        st.dataframe(reporte["areas_afectadas"], hide_index=True, height=250)
     
     if not reporte["sedes_afectadas"].empty:
         st.subheader("🏥 Sedes Afectadas")
-        st.dataframe(reporte["sedes_afectadas"][["Nombre", "Dirección"]], height=200)
+        columnas_sedes = [c for c in ["Nombre", "Dirección", "Zonas"] if c in reporte["sedes_afectadas"].columns]
+        st.dataframe(reporte["sedes_afectadas"][columnas_sedes], height=200)
     
     if not reporte["colaboradores_afectados"].empty:
         st.subheader("👥 Colaboradores Afectados")
-        st.dataframe(reporte["colaboradores_afectados"][["Nombre", "Sede asignada", "Subproceso", "Criticidad"]], height=300)
-        st.markdown(get_table_download_link(reporte["colaboradores_afectados"], "colaboradores_afectados.csv"), unsafe_allow_html=True)
+        columnas_extra = [c for c in ["Zonas", "Distancia al centro (m)"] if c in reporte["colaboradores_afectados"].columns]
+        st.dataframe(reporte["colaboradores_afectados"][["Nombre", "Sede asignada", "Subproceso", "Criticidad"] + columnas_extra], height=300)
+        st.markdown(enlace_csv_en_cache(reporte["clave"], "colaboradores_afectados.csv", reporte["colaboradores_afectados"]), unsafe_allow_html=True)
+    
+    if not reporte.get("colaboradores_sede_afectada", pd.DataFrame()).empty:
+        st.subheader(f"🏢 Colaboradores con Sede Asignada Afectada ({len(reporte['colaboradores_sede_afectada'])})")
+        st.dataframe(reporte["colaboradores_sede_afectada"][["Nombre", "Sede asignada", "Subproceso", "Criticidad"]], height=300)
+        st.markdown(enlace_csv_en_cache(reporte["clave"], "colaboradores_sede_afectada.csv", reporte["colaboradores_sede_afectada"]), unsafe_allow_html=True)
+    
+    if "reubicacion" in reporte and not reporte["reubicacion"].empty:
+        st.subheader("🧭 Plan de Reubicación")
+        st.dataframe(reporte["reubicacion"], height=300, hide_index=True)
+        st.markdown(enlace_csv_en_cache(reporte["clave"], "plan_reubicacion.csv", reporte["reubicacion"]), unsafe_allow_html=True)
     
     st.subheader("📤 Exportar Reporte")
     if st.button("🖨️ Generar PDF del Reporte"):
         with st.spinner("Generando PDF..."):
             try:
-                pdf_bytes = crear_pdf(reporte, tipo_evento, descripcion_emergencia)
+                inicio = time.perf_counter()
+                pdf_bytes = crear_pdf_sesion(reporte, tipo_evento, descripcion_emergencia, graficas)
+                if st.session_state.get("cronometro") is not None:
+                    st.caption(f"⏱️ PDF generado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
                 
                 if pdf_bytes:
                     st.download_button(
                         label="⬇️ Descargar PDF",
                         data=pdf_bytes,
                         file_name=f"reporte_emergencia_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-                        mime="application/pdf"
+                        mime="application/pdf",
+                        on_click="ignore"
                     )
             except Exception as e:
                 st.error(f"Error al generar el PDF: {str(e)}")
 
-# Dashboard general
-if archivo and df is not None:
+@st.fragment
+def panel_dashboard(carga):
+    """Indicadores y gráficas generales del dataset cargado (salen del cubo de conteos)"""
+    cubo = carga["cubo"]
     st.subheader("📊 Dashboard General")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Colaboradores", len(df))
-    col2.metric("Sedes Únicas", df["Sede asignada"].nunique())
-    col3.metric("Ciudades", df["Ciudad"].nunique())
+    col1.metric("Total Colaboradores", cubo.total)
+    col2.metric("Sedes Únicas", cubo.distintos("Sede asignada"))
+    col3.metric("Ciudades", cubo.distintos("Ciudad"))
     
-    fig, ax = plt.subplots(1, 2, figsize=(12, 4))
-    df["Ciudad"].value_counts().head(5).plot(kind='bar', ax=ax[0], color='skyblue')
-    ax[0].set_title('Top 5 Ciudades')
-    df["Sede asignada"].value_counts().head(5).plot(kind='bar', ax=ax[1], color='lightgreen')
-    ax[1].set_title('Top 5 Sedes')
-    st.pyplot(fig)
+    for columna, png in zip(st.columns(2), graficas_dashboard_en_cache(carga["version"], cubo).values()):
+        columna.image(png, use_container_width=True)
+
+# Procesar archivo subido
+filas_filtradas = None
+if carga is not None:
+    with medir("Filtros"):
+        filas_filtradas = aplicar_filtros(carga["version"], ciudad, criticidad, subproceso, area, carga["filtros"])
+
+panel_mapa(tile_provider, registro, carga, filas_filtradas, modo_marcadores,
+           analizar_todas, clave_filtros(ciudad, criticidad, subproceso, area))
+
+# Dashboard general
+if carga is not None:
+    panel_dashboard(carga)
@@ -0,0 +1,84 @@
+"""Áreas administrativas (localidades, municipios) y su cruce con el roster"""
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+from ingesta import huella_contenido
+from texto import remove_accents
+
+COLUMNA_AREA = "Área"
+# Propiedades que se reconocen como nombre del área (sin acentos ni mayúsculas)
+PROPIEDADES_NOMBRE = ["nombre", "name", "locnombre", "localidad", "mpio_cnmbr", "nomb_mpio", "municipio", "nom_mpio"]
+
+
+def _nombre_area(propiedades, posicion):
+    claves = {remove_accents(str(clave)).casefold(): valor for clave, valor in propiedades.items()}
+    for clave in PROPIEDADES_NOMBRE:
+        if claves.get(clave) not in (None, ""):
+            return str(claves[clave]).strip()
+    return f"Área {posicion + 1}"
+
+
+class CatalogoAreas:
+    """Límites administrativos indexados con un STRtree
+
+    Asignar el área de cada colaborador es una sola consulta vectorizada al
+    árbol (predicado "within"), no una prueba de polígono por punto.
+    """
+
+    def __init__(self, nombres, geometrias, version):
+        self.nombres = nombres
+        self.geometrias = geometrias
+        self.version = version
+        self.arbol = STRtree(geometrias)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @classmethod
+    def desde_geojson(cls, contenido):
+        """Catálogo a partir de un GeoJSON (bytes) de polígonos o multipolígonos"""
+        datos = json.loads(contenido.decode("utf-8"))
+        nombres, geometrias, vistos = [], [], {}
+        for feature in datos.get("features", []):
+            geometria = feature.get("geometry") or {}
+            if geometria.get("type") not in ("Polygon", "MultiPolygon"):
+                continue
+            nombre = _nombre_area(feature.get("properties") or {}, len(nombres))
+            # Nombres repetidos (p. ej. municipios homónimos) se numeran
+            vistos[nombre] = vistos.get(nombre, 0) + 1
+            if vistos[nombre] > 1:
+                nombre = f"{nombre} ({vistos[nombre]})"
+            nombres.append(nombre)
+            geometrias.append(shape(geometria))
+        if not geometrias:
+            raise ValueError("El GeoJSON no tiene polígonos de áreas")
+        return cls(nombres, np.array(geometrias, dtype=object), huella_contenido(contenido))
+
+    def asignar(self, latitudes, longitudes):
+        """Área de cada punto como Categorical (vacío si no cae en ninguna)
+
+        Si las áreas se solapan, gana la que aparece primero en el archivo.
+        """
+        puntos = shapely.points(np.asarray(longitudes, dtype="float64"), np.asarray(latitudes, dtype="float64"))
+        entrada, area = self.arbol.query(puntos, predicate="within")
+        orden = np.lexsort((area, entrada))
+        entrada, area = entrada[orden], area[orden]
+        primeras = np.r_[True, entrada[1:] != entrada[:-1]] if len(entrada) else np.zeros(0, dtype=bool)
+        codigos = np.full(len(puntos), -1, dtype="int64")
+        codigos[entrada[primeras]] = area[primeras]
+        return pd.Categorical.from_codes(codigos, categories=self.nombres)
+
+
+def resumen_areas(colaboradores):
+    """Colaboradores afectados por área, con el desglose por criticidad"""
+    if COLUMNA_AREA not in colaboradores.columns or colaboradores.empty:
+        return pd.DataFrame()
+    tabla = colaboradores.groupby([COLUMNA_AREA, "Criticidad"], observed=True).size().unstack(fill_value=0)
+    tabla.insert(0, "Colaboradores", tabla.sum(axis=1))
+    tabla.columns.name = None
+    return tabla.sort_values("Colaboradores", ascending=False, kind="stable").reset_index()
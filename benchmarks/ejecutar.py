@@ -0,0 +1,215 @@
+"""Benchmarks por etapa del motor con rosters sintéticos
+
+    python benchmarks/ejecutar.py                        # compara con referencia.json
+    python benchmarks/ejecutar.py --tamanos 1000 1000000
+    python benchmarks/ejecutar.py --guardar              # actualiza la referencia
+
+Para cada tamaño mide carga del CSV, filtros, reportes (polígono, círculo y
+varias zonas), el mapa folium con sus capas renderizado a HTML (lo que la
+app envía al navegador) y PDF. El tiempo es el mínimo de las repeticiones;
+el pico de memoria sale de una pasada aparte. Cada tamaño corre en un
+proceso nuevo para que la memoria de uno no se mezcle con la del siguiente.
+
+Cada proceso mide también una carga de trabajo fija de calibración y la
+referencia guarda los tiempos como múltiplos de ella, así se puede comparar
+en otra máquina: el tiempo esperado es el múltiplo de la referencia por la
+calibración local. Sale con código 1 si alguna etapa supera lo esperado por
+más de la tolerancia. Entre máquinas de distinta clase (p. ej. portátil
+frente a servidor) la proporción entre etapas varía algo más; ahí conviene
+una tolerancia mayor (--tolerancia-tiempo 1) o regenerar la referencia.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RUTA_REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "referencia.json")
+TAMANOS = [1000, 10000, 100000]
+REPETICIONES = 3
+ZONAS = 8  # Zonas del reporte de varias zonas (la primera es un círculo y la segunda un polígono)
+RADIOS_ZONAS = (3000, 6000)  # Metros; zonas del tamaño de una o dos localidades
+MAX_PUNTOS_CAPA = 100000  # Igual que la capa única de la app
+TOLERANCIA_TIEMPO = 0.5  # Fracción sobre el tiempo esperado antes de marcar regresión
+TOLERANCIA_MEMORIA = 0.25
+HOLGURA_SEGUNDOS = 0.02  # Diferencias absolutas menores no cuentan (ruido en etapas cortas)
+FILAS_CALIBRACION = 100000
+REPETICIONES_CALIBRACION = 10  # La calibración es corta; más repeticiones estabilizan el mínimo
+HOLGURA_MB = 8
+# Cada tamaño corre con malloc devolviendo al sistema los bloques grandes y con
+# pyarrow sobre malloc; así la memoria que libera una etapa no esconde el pico
+# de la siguiente
+ENTORNO_MEDICION = {"MALLOC_MMAP_THRESHOLD_": "131072", "ARROW_DEFAULT_MEMORY_POOL": "system"}
+
+
+def calibrar(repeticiones=REPETICIONES_CALIBRACION):
+    """Segundos (mínimo) de una carga fija de numpy, pandas y JSON en esta máquina"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    tabla = pd.DataFrame({"grupo": rng.integers(0, 1000, FILAS_CALIBRACION), "valor": rng.random(FILAS_CALIBRACION)})
+    filas = tabla.head(FILAS_CALIBRACION // 10).to_numpy().tolist()
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        np.sort(tabla["valor"].to_numpy())
+        tabla.groupby("grupo")["valor"].agg(["sum", "count"])
+        tabla.head(FILAS_CALIBRACION // 10).to_csv(index=False)
+        json.dumps(filas)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def medir_etapas(contenido, zonas, sedes, cronometro):
+    """Corre el flujo completo de la app midiendo cada etapa en el cronómetro"""
+    from motor import cargar_dataset, filtrar, analizar_zona, datos_para_mapa, filas_capa_colaboradores, crear_pdf
+    from mapas import crear_mapa_base, capa_sedes, capa_colaboradores
+
+    with cronometro.etapa("carga"):
+        carga = cargar_dataset(contenido, ruta_snapshots=None)
+    with cronometro.etapa("filtros"):
+        filas = filtrar(carga["filtros"], criticidad=["Alta", "Media"])
+    with cronometro.etapa("reporte_circulo"):
+        analizar_zona(zonas[0], carga, sedes, filas)
+    with cronometro.etapa("reporte_poligono"):
+        reporte = analizar_zona(zonas[1], carga, sedes, filas)
+    with cronometro.etapa("reporte_zonas"):
+        analizar_zona({"type": "FeatureCollection", "features": zonas}, carga, sedes, filas)
+    with cronometro.etapa("mapa"):
+        mapa = crear_mapa_base()
+        capa_sedes(sedes.datos_capa()).add_to(mapa)
+        datos = filas_capa_colaboradores(datos_para_mapa(carga["df"], carga["indice"], MAX_PUNTOS_CAPA, filas))
+        capa_colaboradores(datos).add_to(mapa)
+        html = mapa.get_root().render()
+    cronometro.anotar("mapa_kb", round(len(html) / 1024, 1))
+    cronometro.anotar("colaboradores_reporte", reporte["total_colaboradores"])
+    with cronometro.etapa("pdf"):
+        crear_pdf(reporte, "Otro", "Benchmark")
+
+
+def medir_tamano(tamano, repeticiones, semilla):
+    """Tiempo mínimo y pico de memoria de cada etapa para un tamaño de roster"""
+    from sintetico import roster_csv, generar_zonas
+    from sedes import RegistroSedes, SEDES_FIJAS
+    from tiempos import Cronometro
+
+    contenido = roster_csv(tamano, semilla)
+    radios = {"radio_minimo": RADIOS_ZONAS[0], "radio_maximo": RADIOS_ZONAS[1]}
+    zonas = generar_zonas(ZONAS, semilla, fraccion_circulos=0, **radios)
+    zonas[0] = generar_zonas(1, semilla, fraccion_circulos=1, **radios)[0]
+    sedes = RegistroSedes.desde_diccionario(SEDES_FIJAS)
+
+    tiempos = {}
+    for _ in range(repeticiones):
+        cronometro = Cronometro()
+        medir_etapas(contenido, zonas, sedes, cronometro)
+        for etapa, registro in cronometro.etapas.items():
+            tiempos[etapa] = min(tiempos.get(etapa, float("inf")), registro["segundos"])
+
+    memoria = Cronometro(memoria=True)
+    medir_etapas(contenido, zonas, sedes, memoria)
+    calibracion = calibrar()
+    resultado = {etapa: {"segundos": round(segundos, 4), "relativo": round(segundos / calibracion, 3),
+                         "memoria_mb": round(memoria.etapas[etapa]["memoria_mb"], 1)}
+                 for etapa, segundos in tiempos.items()}
+    resultado["datos"] = {**memoria.datos, "calibracion_s": round(calibracion, 4)}
+    return resultado
+
+
+def comparar(resultados, referencia, tolerancia_tiempo=TOLERANCIA_TIEMPO, tolerancia_memoria=TOLERANCIA_MEMORIA):
+    """Lista de regresiones (texto) de los resultados frente a la referencia
+
+    El tiempo esperado de cada etapa es su múltiplo de calibración en la
+    referencia por la calibración de esta ejecución.
+    """
+    regresiones = []
+    for tamano, etapas in resultados.items():
+        calibracion = etapas["datos"]["calibracion_s"]
+        for etapa, actual in etapas.items():
+            previo = referencia.get(tamano, {}).get(etapa)
+            if etapa == "datos" or previo is None:
+                continue
+            esperado = previo["relativo"] * calibracion
+            if actual["segundos"] > esperado * (1 + tolerancia_tiempo) and \
+                    actual["segundos"] - esperado > HOLGURA_SEGUNDOS:
+                regresiones.append(f"{tamano} filas, {etapa}: {actual['segundos']:.3f} s "
+                                   f"(esperado {esperado:.3f} s según la referencia)")
+            if actual["memoria_mb"] > previo["memoria_mb"] * (1 + tolerancia_memoria) and \
+                    actual["memoria_mb"] - previo["memoria_mb"] > HOLGURA_MB:
+                regresiones.append(f"{tamano} filas, {etapa}: {actual['memoria_mb']:.1f} MB (referencia {previo['memoria_mb']:.1f} MB)")
+    return regresiones
+
+
+def imprimir(resultados):
+    for tamano, etapas in resultados.items():
+        print(f"\n{int(tamano):,} filas  ({', '.join(f'{k}: {v}' for k, v in etapas['datos'].items())})")
+        for etapa, registro in etapas.items():
+            if etapa != "datos":
+                print(f"  {etapa:<18} {registro['segundos'] * 1000:>10.1f} ms {registro['relativo']:>9.3f} x "
+                      f"{registro['memoria_mb']:>9.1f} MB")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks por etapa con rosters sintéticos")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS, help="Filas de cada roster")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES, help="Repeticiones para el tiempo")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de los datos sintéticos")
+    parser.add_argument("--referencia", default=RUTA_REFERENCIA, help="JSON con los resultados de referencia")
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como nueva referencia")
+    parser.add_argument("--salida", help="Guardar los resultados en este JSON")
+    parser.add_argument("--tolerancia-tiempo", type=float, default=TOLERANCIA_TIEMPO)
+    parser.add_argument("--tolerancia-memoria", type=float, default=TOLERANCIA_MEMORIA)
+    return parser
+
+
+def main(argv=None):
+    argumentos = crear_parser().parse_args(argv)
+    os.environ.update(ENTORNO_MEDICION)
+    contexto = multiprocessing.get_context("spawn")
+    resultados = {}
+    for tamano in argumentos.tamanos:
+        with ProcessPoolExecutor(1, mp_context=contexto) as ejecutor:
+            resultados[str(tamano)] = ejecutor.submit(medir_tamano, tamano, argumentos.repeticiones,
+                                                      argumentos.semilla).result()
+    imprimir(resultados)
+
+    if argumentos.salida:
+        with open(argumentos.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2)
+    if argumentos.guardar:
+        referencia = {}
+        if os.path.exists(argumentos.referencia):
+            with open(argumentos.referencia, encoding="utf-8") as archivo:
+                referencia = json.load(archivo)
+        referencia.update(resultados)
+        with open(argumentos.referencia, "w", encoding="utf-8") as archivo:
+            json.dump(referencia, archivo, indent=2)
+        print(f"\nReferencia guardada en {argumentos.referencia}")
+        return 0
+
+    if not os.path.exists(argumentos.referencia):
+        print("\nSin referencia para comparar; use --guardar para crearla")
+        return 0
+    with open(argumentos.referencia, encoding="utf-8") as archivo:
+        referencia = json.load(archivo)
+    if any("relativo" not in registro for etapas in referencia.values()
+           for etapa, registro in etapas.items() if etapa != "datos"):
+        print("\nLa referencia no tiene tiempos relativos a la calibración; regenérela con --guardar",
+              file=sys.stderr)
+        return 1
+    regresiones = comparar(resultados, referencia, argumentos.tolerancia_tiempo, argumentos.tolerancia_memoria)
+    for regresion in regresiones:
+        print(f"REGRESIÓN {regresion}", file=sys.stderr)
+    if not regresiones:
+        print("\nSin regresiones frente a la referencia")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
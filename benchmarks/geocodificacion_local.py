@@ -0,0 +1,184 @@
+"""Geocodificación masiva de extremo a extremo contra un Nominatim local simulado
+
+    python benchmarks/geocodificacion_local.py
+    python benchmarks/geocodificacion_local.py --filas 20000 --tasa 1
+
+Levanta un servidor HTTP que responde /search como Nominatim, apunta el
+Geocodificador a él (igual que NOMINATIM_DOMINIO/NOMINATIM_ESQUEMA) con una
+caché temporal y geocodifica un roster sintético. El servidor no encuentra
+algunas direcciones y falla con 500 en otras; el script verifica el estado
+de cada fila, que cada dirección distinta se consulte una vez y que en una
+segunda pasada solo se reintenten las que fallaron (lo demás sale de la
+caché). Sale con código 1 si algo no cuadra.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+FRACCION_NO_ENCONTRADAS = 0.1
+FRACCION_ERRORES = 0.05
+
+
+def tipo_respuesta(consulta):
+    """"ok", "vacia" o "error", fijo para cada consulta (el mismo en ambas pasadas)"""
+    valor = zlib.crc32(consulta.encode("utf-8")) % 1000 / 1000
+    if valor < FRACCION_ERRORES:
+        return "error"
+    if valor < FRACCION_ERRORES + FRACCION_NO_ENCONTRADAS:
+        return "vacia"
+    return "ok"
+
+
+def coordenadas_simuladas(consulta):
+    """Punto determinista dentro de Bogotá para la consulta"""
+    valor = zlib.crc32(consulta.encode("utf-8"))
+    return 4.47 + (valor % 3600) / 10000, -74.22 + (valor // 3600 % 2200) / 10000
+
+
+class ServidorNominatim(ThreadingHTTPServer):
+    """Servidor local con el formato de respuesta de /search de Nominatim"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ManejadorNominatim)
+        self.consultas = {}
+        self.lock = threading.Lock()
+
+    def registrar(self, consulta):
+        with self.lock:
+            self.consultas[consulta] = self.consultas.get(consulta, 0) + 1
+
+
+class ManejadorNominatim(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        consulta = parse_qs(url.query).get("q", [""])[0]
+        if url.path != "/search" or not consulta:
+            self.send_error(404)
+            return
+        self.server.registrar(consulta)
+        tipo = tipo_respuesta(consulta)
+        if tipo == "error":
+            self.send_error(500)
+            return
+        resultados = []
+        if tipo == "ok":
+            lat, lon = coordenadas_simuladas(consulta)
+            resultados.append({"lat": str(lat), "lon": str(lon), "display_name": consulta})
+        cuerpo = json.dumps(resultados).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def verificar(df, enriquecido, estados, consultas):
+    """Lista de inconsistencias (texto) entre los estados y las respuestas del servidor
+
+    `consultas` tiene la consulta enviada por cada fila sin coordenadas.
+    """
+    from geocodificacion import ESTADO_ORIGINAL, ESTADO_GEOCODIFICADA, ESTADO_NO_ENCONTRADA, ESTADO_ERROR
+
+    esperado = {"ok": ESTADO_GEOCODIFICADA, "vacia": ESTADO_NO_ENCONTRADA, "error": ESTADO_ERROR}
+    errores = []
+    originales = ~df.index.isin(consultas.index)
+    if (estados[originales] != ESTADO_ORIGINAL).any() or \
+            not enriquecido.loc[originales, ["Latitud", "Longitud"]].equals(df.loc[originales, ["Latitud", "Longitud"]]):
+        errores.append("se modificaron filas que ya tenían coordenadas")
+    for fila, consulta in consultas.items():
+        estado = estados.loc[fila]
+        if estado != esperado[tipo_respuesta(consulta)]:
+            errores.append(f"fila {fila}: estado {estado}, se esperaba {esperado[tipo_respuesta(consulta)]}")
+        elif estado == ESTADO_GEOCODIFICADA:
+            lat, lon = coordenadas_simuladas(consulta)
+            if abs(enriquecido.at[fila, "Latitud"] - lat) > 1e-9 or abs(enriquecido.at[fila, "Longitud"] - lon) > 1e-9:
+                errores.append(f"fila {fila}: coordenadas distintas a las del servidor")
+    return errores
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Geocodificación masiva contra un Nominatim local simulado")
+    parser.add_argument("--filas", type=int, default=5000, help="Filas del roster sintético")
+    parser.add_argument("--sin-coordenadas", type=float, default=0.05, help="Fracción de filas sin coordenadas")
+    parser.add_argument("--tasa", type=float, default=200.0,
+                        help="Peticiones por segundo (el servicio público admite 1)")
+    parser.add_argument("--trabajadores", type=int, default=4, help="Hilos de geocodificación")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del roster sintético")
+    return parser
+
+
+def main(argv=None):
+    from geocodificacion import Geocodificador, CacheGeocodificacion, LimitadorTasa, geocodificar_faltantes
+    from ingesta import coordenadas_validas
+    from sintetico import generar_roster
+
+    argumentos = crear_parser().parse_args(argv)
+    df = generar_roster(argumentos.filas, argumentos.semilla, argumentos.sin_coordenadas)
+    # Algunas direcciones repetidas para comprobar que se consultan una sola vez
+    sin_coordenadas = df.index[~coordenadas_validas(df)]
+    df.loc[sin_coordenadas[1::3], "Dirección"] = df.loc[sin_coordenadas[0], "Dirección"]
+    df.loc[sin_coordenadas[1::3], "Ciudad"] = df.loc[sin_coordenadas[0], "Ciudad"]
+
+    servidor = ServidorNominatim()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    errores = []
+    with tempfile.TemporaryDirectory() as carpeta:
+        geocodificador = Geocodificador(
+            cache=CacheGeocodificacion(os.path.join(carpeta, "cache.sqlite")),
+            limitador=LimitadorTasa(tasa=argumentos.tasa),
+            dominio=f"127.0.0.1:{servidor.server_address[1]}", esquema="http"
+        )
+        avance = []
+        inicio = time.perf_counter()
+        enriquecido, estados = geocodificar_faltantes(df, geocodificador, argumentos.trabajadores,
+                                                      progreso=lambda hechas, total: avance.append((hechas, total)))
+        segundos = time.perf_counter() - inicio
+
+        pendientes = df[~coordenadas_validas(df)]
+        consultas = pendientes["Dirección"].str.strip() + ", " + pendientes["Ciudad"].str.strip() + ", Colombia"
+        errores += verificar(df, enriquecido, estados, consultas)
+
+        distintas = set(consultas)
+        repetidas = [consulta for consulta, veces in servidor.consultas.items() if veces > 1]
+        if set(servidor.consultas) != distintas or repetidas:
+            errores.append(f"{len(servidor.consultas)} consultas distintas al servidor ({len(repetidas)} repetidas); "
+                           f"se esperaban {len(distintas)} sin repetir")
+        if not avance or avance[-1] != (len(distintas), len(distintas)):
+            errores.append(f"el progreso terminó en {avance[-1] if avance else None}")
+
+        # Segunda pasada: lo encontrado y lo no encontrado sale de la caché; los errores se reintentan
+        antes = sum(servidor.consultas.values())
+        geocodificar_faltantes(df, geocodificador, argumentos.trabajadores)
+        reintentos = sum(servidor.consultas.values()) - antes
+        fallidas = sum(tipo_respuesta(consulta) == "error" for consulta in distintas)
+        if reintentos != fallidas:
+            errores.append(f"la segunda pasada hizo {reintentos} consultas; se esperaban {fallidas} (solo errores)")
+    servidor.shutdown()
+
+    resumen = estados[estados != "original"].value_counts().to_dict()
+    print(f"{len(df):,} filas, {len(distintas)} direcciones distintas sin coordenadas en {segundos:.2f} s "
+          f"({len(distintas) / segundos:.0f} consultas/s): {resumen}")
+    for error in errores[:20]:
+        print(f"ERROR {error}", file=sys.stderr)
+    if not errores:
+        print("Geocodificación local correcta")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Reportes de impacto por línea de comandos, sin abrir la app
+
+Ejemplo:
+    python cli.py roster.csv zona_norte.geojson zona_sur.geojson --salida reportes --pdf
+
+Cada archivo de zona (Feature, FeatureCollection o geometría GeoJSON) produce
+sus CSV, un resumen JSON y, con --pdf, el PDF del reporte. El roster se carga
+una vez y las zonas se reparten entre procesos.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Tablas del reporte que se escriben como CSV
+TABLAS_REPORTE = ["colaboradores_afectados", "sedes_afectadas", "colaboradores_sede_afectada",
+                  "reubicacion", "areas_afectadas", "zonas"]
+
+# Dataset, sedes y filas filtradas de cada proceso (se cargan una vez por proceso)
+_ESTADO = {}
+
+
+def leer_zona(ruta):
+    """Zona a analizar a partir de un archivo GeoJSON
+
+    Una FeatureCollection de una sola zona se trata como esa zona; una
+    geometría suelta se envuelve en un Feature.
+    """
+    with open(ruta, encoding="utf-8") as archivo:
+        zona = json.load(archivo)
+    if zona.get("type") == "FeatureCollection":
+        if len(zona.get("features", [])) == 1:
+            return zona["features"][0]
+        return zona
+    if zona.get("type") != "Feature":
+        return {"type": "Feature", "properties": {}, "geometry": zona}
+    return zona
+
+
+def cargar_estado(argumentos):
+    """Carga roster, sedes, áreas y filtros en el estado del proceso"""
+    from motor import cargar_dataset, filtrar
+    from sedes import RegistroSedes, SEDES_FIJAS
+    from areas import CatalogoAreas
+
+    areas = None
+    if argumentos.areas:
+        with open(argumentos.areas, "rb") as archivo:
+            areas = CatalogoAreas.desde_geojson(archivo.read())
+    if argumentos.sedes:
+        with open(argumentos.sedes, "rb") as archivo:
+            sedes = RegistroSedes.desde_archivo(archivo.read(), argumentos.sedes)
+    else:
+        sedes = RegistroSedes.desde_diccionario(SEDES_FIJAS)
+    with open(argumentos.roster, "rb") as archivo:
+        carga = cargar_dataset(archivo.read(), areas=areas)
+
+    hay_filtros = any([argumentos.ciudad, argumentos.criticidad, argumentos.subproceso, argumentos.area])
+    filas = filtrar(carga["filtros"], argumentos.ciudad, argumentos.criticidad,
+                    argumentos.subproceso, argumentos.area) if hay_filtros else None
+    _ESTADO.update(carga=carga, sedes=sedes, filas=filas)
+
+
+def _iniciar_proceso(argumentos):
+    # Con "fork" el proceso hijo ya hereda el estado del padre
+    if not _ESTADO:
+        cargar_estado(argumentos)
+
+
+def procesar_zona(ruta, argumentos):
+    """Analiza una zona y escribe sus archivos; devuelve un resumen (dict)"""
+    from motor import analizar_zona, crear_pdf
+
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    try:
+        reporte = analizar_zona(leer_zona(ruta), _ESTADO["carga"], _ESTADO["sedes"], _ESTADO["filas"])
+        if reporte is None:
+            return {"zona": nombre, "error": "La zona no tiene geometría"}
+
+        prefijo = os.path.join(argumentos.salida, nombre)
+        archivos = []
+        for tabla in TABLAS_REPORTE:
+            if tabla in reporte and not reporte[tabla].empty:
+                archivos.append(f"{prefijo}_{tabla}.csv")
+                reporte[tabla].to_csv(archivos[-1], index=False)
+        if argumentos.pdf:
+            archivos.append(f"{prefijo}.pdf")
+            with open(archivos[-1], "wb") as archivo:
+                archivo.write(crear_pdf(reporte, argumentos.tipo_evento, argumentos.descripcion))
+
+        resumen = {"zona": nombre, "total_colaboradores": reporte["total_colaboradores"],
+                   "total_sedes": reporte["total_sedes"], "archivos": archivos}
+        with open(f"{prefijo}_resumen.json", "w", encoding="utf-8") as archivo:
+            json.dump(resumen, archivo, ensure_ascii=False, indent=2)
+        return resumen
+    except Exception as e:
+        return {"zona": nombre, "error": str(e)}
+
+
+def procesar_zonas(argumentos):
+    """Resúmenes de todas las zonas, en paralelo si hay más de un trabajador"""
+    trabajadores = max(1, min(argumentos.trabajadores, len(argumentos.zonas)))
+    cargar_estado(argumentos)
+    if trabajadores == 1:
+        return [procesar_zona(ruta, argumentos) for ruta in argumentos.zonas]
+
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+    with ProcessPoolExecutor(trabajadores, mp_context=contexto, initializer=_iniciar_proceso,
+                             initargs=(argumentos,)) as ejecutor:
+        return list(ejecutor.map(procesar_zona, argumentos.zonas, [argumentos] * len(argumentos.zonas)))
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Reportes de impacto por zona a partir de un roster CSV")
+    parser.add_argument("roster", help="CSV de colaboradores")
+    parser.add_argument("zonas", nargs="+", help="Archivos GeoJSON con las zonas a analizar")
+    parser.add_argument("--salida", default="reportes", help="Carpeta de salida (por defecto: reportes)")
+    parser.add_argument("--sedes", help="Catálogo de sedes (CSV o GeoJSON); por defecto las sedes fijas")
+    parser.add_argument("--areas", help="GeoJSON de áreas administrativas")
+    parser.add_argument("--ciudad", nargs="*", help="Filtrar por ciudad")
+    parser.add_argument("--criticidad", nargs="*", help="Filtrar por criticidad")
+    parser.add_argument("--subproceso", nargs="*", help="Filtrar por subproceso")
+    parser.add_argument("--area", nargs="*", help="Filtrar por área (requiere --areas)")
+    parser.add_argument("--pdf", action="store_true", help="Generar también el PDF de cada zona")
+    parser.add_argument("--tipo-evento", default="Otro", help="Tipo de evento para el PDF")
+    parser.add_argument("--descripcion", default="", help="Descripción de la emergencia para el PDF")
+    parser.add_argument("--trabajadores", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para analizar zonas en paralelo")
+    return parser
+
+
+def main(argv=None):
+    argumentos = crear_parser().parse_args(argv)
+    os.makedirs(argumentos.salida, exist_ok=True)
+    try:
+        resumenes = procesar_zonas(argumentos)
+    except Exception as e:
+        print(f"Error al cargar datos: {e}", file=sys.stderr)
+        return 2
+
+    fallidas = 0
+    for resumen in resumenes:
+        if "error" in resumen:
+            fallidas += 1
+            print(f"{resumen['zona']}: error - {resumen['error']}", file=sys.stderr)
+        else:
+            print(f"{resumen['zona']}: {resumen['total_colaboradores']} colaboradores, "
+                  f"{resumen['total_sedes']} sedes")
+    return 1 if fallidas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
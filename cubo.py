@@ -0,0 +1,66 @@
+"""Cubo de conteos por Ciudad × Sede asignada × Criticidad × Subproceso"""
+import numpy as np
+import pandas as pd
+
+from filtros import codigos_categoria
+
+COLUMNAS_CUBO = ["Ciudad", "Sede asignada", "Criticidad", "Subproceso"]
+
+
+class CuboAgregados:
+    """Conteos de filas por combinación de categorías, calculados una vez por dataset
+
+    Cada fila cae en una celda (combinación de valores presente en los datos).
+    Los totales por columna salen de sumar las celdas, no de recorrer las filas,
+    así que las opciones de filtro y el dashboard no dependen del tamaño del
+    roster. Para un subconjunto de filas basta un bincount sobre sus celdas.
+    """
+
+    def __init__(self, df, columnas=COLUMNAS_CUBO):
+        self.total = len(df)
+        self.columnas = list(columnas)
+        self.valores = {}
+        codigos = []
+        clave = np.zeros(len(df), dtype="int64")
+        for columna in self.columnas:
+            codigo, categorias = codigos_categoria(df[columna])
+            clave = clave * (len(categorias) + 1) + codigo
+            self.valores[columna] = pd.Index(categorias, name=columna)
+            codigos.append(codigo)
+
+        # Celdas presentes, cuántas filas tiene cada una y la celda de cada fila
+        claves, primera, self.celda_fila, self.conteos = np.unique(
+            clave, return_index=True, return_inverse=True, return_counts=True
+        )
+        self.celdas = {columna: codigo[primera] for columna, codigo in zip(self.columnas, codigos)}
+        self._totales = {columna: self._marginal(columna, self.conteos) for columna in self.columnas}
+
+    def __len__(self):
+        return len(self.conteos)
+
+    def _marginal(self, columna, conteos):
+        valores = self.valores[columna]
+        suma = np.bincount(self.celdas[columna], weights=conteos, minlength=len(valores) + 1)[:len(valores)]
+        serie = pd.Series(suma.astype("int64"), index=valores, name="count")
+        return serie[serie > 0].sort_values(ascending=False, kind="stable")
+
+    def totales(self, columna):
+        """Filas por valor de la columna, de mayor a menor (sin valores ausentes)"""
+        return self._totales[columna]
+
+    def opciones(self, columna):
+        """Valores presentes de una columna, ordenados"""
+        return sorted(self._totales[columna].index.tolist())
+
+    def distintos(self, columna):
+        """Cantidad de valores distintos presentes en la columna"""
+        return len(self._totales[columna])
+
+    def marginales(self, posiciones, columnas=None):
+        """Totales por columna de un subconjunto de filas, en una sola pasada
+
+        Las filas se agrupan primero por celda; los totales de cada columna
+        salen de esas celdas.
+        """
+        conteos = np.bincount(self.celda_fila[np.asarray(posiciones, dtype="int64")], minlength=len(self))
+        return {columna: self._marginal(columna, conteos) for columna in (columnas or self.columnas)}
@@ -0,0 +1,110 @@
+"""Pirámide de densidad: conteos por celda de rejilla en varios niveles de zoom"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from filtros import codigos_categoria
+
+TAMANO_CELDA_PX = 32  # Lado aproximado de una celda en pantalla, en píxeles
+ZOOM_MINIMO = 4
+ZOOM_MAXIMO = 17
+MAX_CELDAS_VISTA = 1500  # Si la vista tiene más celdas se usa el nivel anterior
+SIN_DATO = "Sin dato"
+
+
+def tamano_celda(zoom):
+    """Lado de la celda (grados) para que mida unos TAMANO_CELDA_PX en ese zoom"""
+    return 360.0 / 2 ** zoom / 256 * TAMANO_CELDA_PX
+
+
+class PiramideDensidad:
+    """Conteos por celda y por criticidad en cada nivel de zoom, calculados una vez
+
+    Cada nivel guarda solo las celdas con colaboradores (índices enteros de
+    columna y fila) y una matriz celdas × categorías. Consultar una vista es
+    filtrar esas celdas por la caja visible, sin tocar las filas del roster.
+    Los niveles se calculan en la primera consulta: solo el más fino recorre
+    las filas y cada nivel anterior suma las celdas del siguiente, porque el
+    lado de la celda se duplica de un zoom al anterior.
+    """
+
+    def __init__(self, latitudes, longitudes, categorias, zoom_minimo=ZOOM_MINIMO, zoom_maximo=ZOOM_MAXIMO):
+        self.zoom_minimo = zoom_minimo
+        self.zoom_maximo = zoom_maximo
+        self.total = len(latitudes)
+        self._datos = (latitudes, longitudes, categorias)
+        self._niveles = None
+        self._lock = threading.Lock()
+
+    @property
+    def niveles(self):
+        """Niveles por zoom; se construyen en el primer acceso"""
+        if self._niveles is None:
+            with self._lock:
+                if self._niveles is None:
+                    self._niveles = self._construir(*self._datos)
+                    self._datos = None
+        return self._niveles
+
+    def _construir(self, latitudes, longitudes, categorias):
+        latitudes = np.asarray(latitudes, dtype="float64")
+        longitudes = np.asarray(longitudes, dtype="float64")
+        # El vacío queda en la última columna, "Sin dato"
+        codigos, categorias = codigos_categoria(categorias)
+        self.categorias = [str(c) for c in categorias] + [SIN_DATO]
+
+        columna = np.floor(longitudes / tamano_celda(self.zoom_maximo)).astype("int64")
+        fila = np.floor(latitudes / tamano_celda(self.zoom_maximo)).astype("int64")
+        niveles = {self.zoom_maximo: self._nivel(columna, fila, codigos, self.zoom_maximo)}
+        for zoom in range(self.zoom_maximo - 1, self.zoom_minimo - 1, -1):
+            siguiente = niveles[zoom + 1]
+            # floor(x / 2t) == floor(floor(x / t) / 2): la celda gruesa es la fina desplazada un bit
+            niveles[zoom] = self._nivel(siguiente["columna"] >> 1, siguiente["fila"] >> 1, siguiente["conteos"], zoom)
+        return niveles
+
+    def _nivel(self, columna, fila, valores, zoom):
+        # `valores` son los códigos de categoría de cada fila o los conteos
+        # (celdas × categorías) del nivel siguiente
+        k = len(self.categorias)
+        if len(columna) == 0:
+            vacio = np.zeros(0, dtype="int64")
+            return {"tamano": tamano_celda(zoom), "columna": vacio, "fila": vacio,
+                    "conteos": np.zeros((0, k), dtype="int64")}
+        alto = int(fila.max() - fila.min()) + 1
+        clave = (columna - columna.min()) * alto + (fila - fila.min())
+        claves, primera, inversa = np.unique(clave, return_index=True, return_inverse=True)
+        if valores.ndim == 1:
+            conteos = np.bincount(inversa * k + valores, minlength=len(claves) * k).reshape(len(claves), k)
+        else:
+            conteos = np.zeros((len(claves), k), dtype="int64")
+            np.add.at(conteos, inversa, valores)
+        return {"tamano": tamano_celda(zoom), "columna": columna[primera], "fila": fila[primera], "conteos": conteos}
+
+    def celdas(self, zoom, sur, oeste, norte, este, maximo=MAX_CELDAS_VISTA):
+        """Celdas visibles en la caja para el zoom dado
+
+        Si hay más de `maximo`, baja de nivel hasta que quepan. Devuelve el
+        zoom usado y un DataFrame con la caja de cada celda, el total y una
+        columna de conteo por categoría.
+        """
+        zoom = int(min(max(round(zoom), min(self.niveles)), max(self.niveles)))
+        while True:
+            nivel = self.niveles[zoom]
+            tamano = nivel["tamano"]
+            visibles = ((nivel["columna"] + 1) * tamano >= oeste) & (nivel["columna"] * tamano <= este) & \
+                       ((nivel["fila"] + 1) * tamano >= sur) & (nivel["fila"] * tamano <= norte)
+            if visibles.sum() <= maximo or zoom == min(self.niveles):
+                break
+            zoom -= 1
+
+        conteos = nivel["conteos"][visibles]
+        celdas = pd.DataFrame(conteos, columns=self.categorias)
+        if not celdas[SIN_DATO].any():
+            celdas = celdas.drop(columns=SIN_DATO)
+        celdas.insert(0, "Total", conteos.sum(axis=1))
+        celdas.insert(0, "Este", (nivel["columna"][visibles] + 1) * tamano)
+        celdas.insert(0, "Norte", (nivel["fila"][visibles] + 1) * tamano)
+        celdas.insert(0, "Oeste", nivel["columna"][visibles] * tamano)
+        celdas.insert(0, "Sur", nivel["fila"][visibles] * tamano)
+        return zoom, celdas
@@ -0,0 +1,306 @@
+"""Motor espacial vectorizado para el análisis de zonas de emergencia"""
+import hashlib
+import json
+import threading
+
+import numpy as np
+import shapely
+import shapely.geometry
+
+# Precisión usada al comparar coordenadas (≈1 m), igual que el cálculo original
+DECIMALES_COORDENADAS = 5
+# Radio terrestre que usa Leaflet para medir círculos, en metros
+RADIO_TIERRA_M = 6371000.0
+MAX_ARBOLES_EXCLUSION = 16  # Árboles de sedes disponibles guardados por conjunto excluido
+
+
+def coordenadas_redondeadas(latitudes, longitudes):
+    """Convierte las coordenadas a arreglos float64 redondeados"""
+    lat = np.round(np.asarray(latitudes, dtype="float64"), DECIMALES_COORDENADAS)
+    lon = np.round(np.asarray(longitudes, dtype="float64"), DECIMALES_COORDENADAS)
+    return lat, lon
+
+
+def en_caja(lat, lon, minx, miny, maxx, maxy):
+    """Posiciones de los puntos dentro de la caja envolvente (bordes incluidos)"""
+    return np.flatnonzero((lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy))
+
+
+def puntos_en_zona(latitudes, longitudes, zona_shape):
+    """Devuelve una máscara booleana con los puntos contenidos en la zona"""
+    lat, lon = coordenadas_redondeadas(latitudes, longitudes)
+    mascara = np.zeros(len(lat), dtype=bool)
+    if zona_shape.is_empty or not len(lat):
+        return mascara
+
+    # Prefiltro por caja envolvente antes de la prueba exacta
+    candidatos = en_caja(lat, lon, *zona_shape.bounds)
+    if candidatos.size:
+        shapely.prepare(zona_shape)
+        mascara[candidatos] = shapely.contains_xy(zona_shape, lon[candidatos], lat[candidatos])
+    return mascara
+
+
+
+def es_circulo(zona):
+    """Leaflet.draw exporta los círculos como un Point con la propiedad radius"""
+    geometria = zona.get("geometry") or {}
+    return geometria.get("type") == "Point" and (zona.get("properties") or {}).get("radius") is not None
+
+
+def datos_circulo(zona):
+    """Centro (lat, lon) y radio en metros de una zona circular"""
+    lon, lat = zona["geometry"]["coordinates"][:2]
+    return float(lat), float(lon), float(zona["properties"]["radius"])
+
+
+def caja_circulo(lat, lon, radio_m):
+    """Caja envolvente (minx, miny, maxx, maxy) en grados de un círculo geodésico"""
+    delta_lat = np.degrees(radio_m / RADIO_TIERRA_M)
+    coseno = max(np.cos(np.radians(lat)), 1e-6)
+    delta_lon = min(np.degrees(radio_m / (RADIO_TIERRA_M * coseno)), 180.0)
+    return lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat
+
+
+def distancia_haversine(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en metros (vectorizada)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def puntos_en_circulo(latitudes, longitudes, lat, lon, radio_m):
+    """Posiciones y distancias (m) de los puntos dentro de un círculo geodésico"""
+    lat_p, lon_p = coordenadas_redondeadas(latitudes, longitudes)
+    candidatos = en_caja(lat_p, lon_p, *caja_circulo(lat, lon, radio_m))
+    distancias = distancia_haversine(lat, lon, lat_p[candidatos], lon_p[candidatos])
+    dentro = distancias <= radio_m
+    return candidatos[dentro], distancias[dentro]
+
+
+
+def caja_zona(zona):
+    """Caja envolvente (minx, miny, maxx, maxy) de una zona GeoJSON o círculo"""
+    if es_circulo(zona):
+        return caja_circulo(*datos_circulo(zona))
+    return shapely.geometry.shape(zona["geometry"]).bounds
+
+
+def _dentro_de_zona(zona, lat, lon):
+    # Máscara exacta de pertenencia de los puntos dados a una zona o círculo
+    if es_circulo(zona):
+        lat_c, lon_c, radio = datos_circulo(zona)
+        return distancia_haversine(lat_c, lon_c, lat, lon) <= radio
+    zona_shape = shapely.geometry.shape(zona["geometry"])
+    shapely.prepare(zona_shape)
+    return shapely.contains_xy(zona_shape, lon, lat)
+
+
+def pertenencia_zonas(latitudes, longitudes, zonas):
+    """Matriz booleana (puntos × zonas) de pertenencia de cada punto a cada zona
+
+    Recorre las coordenadas una vez por zona; con un IndiceEspacial es mejor
+    IndiceEspacial.pertenencia_zonas, que solo mira las celdas de cada zona.
+    """
+    lat, lon = coordenadas_redondeadas(latitudes, longitudes)
+    matriz = np.zeros((len(lat), len(zonas)), dtype=bool)
+    for columna, zona in enumerate(zonas):
+        candidatos = en_caja(lat, lon, *caja_zona(zona))
+        if candidatos.size:
+            matriz[candidatos[_dentro_de_zona(zona, lat[candidatos], lon[candidatos])], columna] = True
+    return matriz
+
+
+class IndiceEspacial:
+    """Índice de rejilla uniforme sobre las coordenadas de un DataFrame
+
+    Las posiciones devueltas son posiciones de fila del DataFrame indexado.
+    Los puntos se ordenan por celda (fila-mayor), de modo que cada fila de
+    celdas de una consulta es un rango contiguo que se localiza con búsqueda
+    binaria y el costo crece con el tamaño de la zona, no con el del roster.
+    """
+
+    def __init__(self, latitudes, longitudes, tamano_celda=0.01):
+        lat, lon = coordenadas_redondeadas(latitudes, longitudes)
+        self.tamano_celda = tamano_celda
+        self.n = len(lat)
+        self.lat_min = float(lat.min()) if self.n else 0.0
+        self.lon_min = float(lon.min()) if self.n else 0.0
+        filas = self._celda(lat, self.lat_min)
+        columnas = self._celda(lon, self.lon_min)
+        self.n_columnas = int(columnas.max()) + 1 if self.n else 1
+        self.n_filas = int(filas.max()) + 1 if self.n else 1
+
+        codigos = filas * self.n_columnas + columnas
+        self.orden = np.argsort(codigos, kind="stable")
+        self.codigos = codigos[self.orden]
+        self.lat = lat[self.orden]
+        self.lon = lon[self.orden]
+
+    def _celda(self, valores, origen):
+        return np.floor((valores - origen) / self.tamano_celda).astype("int64")
+
+    def _rango(self, valor_min, valor_max, origen, limite):
+        inicio = max(int(np.floor((valor_min - origen) / self.tamano_celda)), 0)
+        fin = min(int(np.floor((valor_max - origen) / self.tamano_celda)), limite - 1)
+        return inicio, fin
+
+    def candidatos(self, minx, miny, maxx, maxy):
+        """Posiciones (en orden de celda) de los puntos en las celdas de la caja"""
+        if not self.n:
+            return np.empty(0, dtype="int64")
+        fila_ini, fila_fin = self._rango(miny, maxy, self.lat_min, self.n_filas)
+        col_ini, col_fin = self._rango(minx, maxx, self.lon_min, self.n_columnas)
+        if fila_ini > fila_fin or col_ini > col_fin:
+            return np.empty(0, dtype="int64")
+
+        filas = np.arange(fila_ini, fila_fin + 1, dtype="int64") * self.n_columnas
+        inicios = np.searchsorted(self.codigos, filas + col_ini, side="left")
+        fines = np.searchsorted(self.codigos, filas + col_fin, side="right")
+        tramos = [np.arange(i, f) for i, f in zip(inicios, fines) if f > i]
+        if not tramos:
+            return np.empty(0, dtype="int64")
+        return np.concatenate(tramos)
+
+    def pertenencia_zonas(self, zonas):
+        """Posiciones de fila (ordenadas) dentro de alguna zona y su matriz
+        booleana (posiciones × zonas) de pertenencia
+
+        Cada zona evalúa solo los puntos de las celdas de su caja envolvente.
+        """
+        miembros = []
+        for zona in zonas:
+            tramo = self.candidatos(*caja_zona(zona))
+            miembros.append(self.orden[tramo[_dentro_de_zona(zona, self.lat[tramo], self.lon[tramo])]]
+                            if tramo.size else tramo)
+        posiciones = np.unique(np.concatenate(miembros)) if miembros else np.empty(0, dtype="int64")
+        matriz = np.zeros((len(posiciones), len(zonas)), dtype=bool)
+        for columna, filas in enumerate(miembros):
+            matriz[np.searchsorted(posiciones, filas), columna] = True
+        return posiciones, matriz
+
+    def consultar(self, zona_shape):
+        """Posiciones de fila (ordenadas) de los puntos contenidos en la zona"""
+        if zona_shape.is_empty:
+            return np.empty(0, dtype="int64")
+        minx, miny, maxx, maxy = zona_shape.bounds
+        tramo = self.candidatos(minx, miny, maxx, maxy)
+        if not tramo.size:
+            return np.empty(0, dtype="int64")
+        shapely.prepare(zona_shape)
+        dentro = shapely.contains_xy(zona_shape, self.lon[tramo], self.lat[tramo])
+        return np.sort(self.orden[tramo[dentro]])
+
+    def consultar_circulo(self, lat, lon, radio_m):
+        """Posiciones (ordenadas) y distancias en metros de los puntos del círculo"""
+        tramo = self.candidatos(*caja_circulo(lat, lon, radio_m))
+        if not tramo.size:
+            return np.empty(0, dtype="int64"), np.empty(0)
+        distancias = distancia_haversine(lat, lon, self.lat[tramo], self.lon[tramo])
+        dentro = distancias <= radio_m
+        posiciones = self.orden[tramo[dentro]]
+        orden = np.argsort(posiciones)
+        return posiciones[orden], distancias[dentro][orden]
+
+    def muestra_estratificada(self, etiquetas, maximo):
+        """Submuestra determinista y repartida por celdas de las etiquetas dadas"""
+        etiquetas = np.asarray(etiquetas, dtype="int64")
+        if len(etiquetas) <= maximo:
+            return etiquetas
+        incluidas = np.zeros(self.n, dtype=bool)
+        incluidas[etiquetas] = True
+        # Recorrer en orden de celda y tomar pasos regulares reparte la muestra en el espacio
+        en_orden = self.orden[incluidas[self.orden]]
+        pasos = np.linspace(0, len(en_orden) - 1, maximo).astype("int64")
+        return np.sort(en_orden[pasos])
+
+
+def _redondear_geojson(valor, decimales):
+    if isinstance(valor, float):
+        return round(valor, decimales)
+    if isinstance(valor, (list, tuple)):
+        return [_redondear_geojson(v, decimales) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _redondear_geojson(v, decimales) for k, v in valor.items()}
+    return valor
+
+
+def huella_zona(zona, decimales=7):
+    """Hash canónico de una zona GeoJSON (geometría y propiedades como el radio)
+
+    Para una FeatureCollection combina, en orden, las huellas de sus zonas.
+    """
+    if zona.get("type") == "FeatureCollection":
+        canonica = [huella_zona(f, decimales) for f in zona.get("features", [])]
+    else:
+        canonica = {
+            "geometry": zona.get("geometry"),
+            "properties": zona.get("properties") or {},
+        }
+    texto = json.dumps(_redondear_geojson(canonica, decimales), sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def a_vectores_unitarios(latitudes, longitudes):
+    """Coordenadas geográficas como vectores unitarios 3D (cuerda ∝ gran círculo)"""
+    lat = np.radians(np.asarray(latitudes, dtype="float64"))
+    lon = np.radians(np.asarray(longitudes, dtype="float64"))
+    coseno = np.cos(lat)
+    return np.column_stack([coseno * np.cos(lon), coseno * np.sin(lon), np.sin(lat)])
+
+
+class IndiceSedes:
+    """Árbol KD sobre las sedes para buscar las más cercanas por gran círculo
+
+    Se construye una vez por catálogo. Las sedes se proyectan a la esfera
+    unitaria, donde la distancia euclidiana (cuerda) ordena igual que la de
+    gran círculo y se convierte a metros al final. Para excluir sedes se
+    consulta un árbol de solo las disponibles, guardado por conjunto excluido.
+    """
+
+    def __init__(self, nombres, latitudes, longitudes):
+        from scipy.spatial import cKDTree
+        self.nombres = np.asarray(nombres, dtype=object)
+        self.vectores = a_vectores_unitarios(latitudes, longitudes)
+        self.arbol = cKDTree(self.vectores)
+        self._arboles = {}  # Posiciones excluidas -> (posiciones disponibles, árbol)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _arbol_sin(self, excluidas):
+        # Árbol de las sedes no excluidas; construirlo cuesta poco frente a las consultas
+        from scipy.spatial import cKDTree
+        clave = tuple(np.flatnonzero(excluidas))
+        if not clave:
+            return np.arange(len(self)), self.arbol
+        with self._lock:
+            guardado = self._arboles.get(clave)
+        if guardado is None:
+            disponibles = np.flatnonzero(~excluidas)
+            guardado = (disponibles, cKDTree(self.vectores[disponibles]) if len(disponibles) else None)
+            with self._lock:
+                if len(self._arboles) >= MAX_ARBOLES_EXCLUSION:
+                    del self._arboles[next(iter(self._arboles))]
+                self._arboles[clave] = guardado
+        return guardado
+
+    def cercanas(self, latitudes, longitudes, k=3, excluir=()):
+        """Las k sedes más cercanas a cada punto, omitiendo las de `excluir`
+
+        Devuelve (posiciones de sede, distancias en metros), ambos de forma
+        (n, k); las casillas sin sede disponible quedan con -1 y NaN.
+        """
+        n = len(latitudes)
+        disponibles, arbol = self._arbol_sin(np.isin(self.nombres, list(excluir)))
+        pedir = min(k, len(disponibles))
+        posiciones = np.full((n, k), -1, dtype="int64")
+        distancias = np.full((n, k), np.nan)
+        if not n or not pedir:
+            return posiciones, distancias
+
+        cuerdas, vecinos = arbol.query(a_vectores_unitarios(latitudes, longitudes), k=pedir, workers=-1)
+        posiciones[:, :pedir] = disponibles[vecinos.reshape(n, pedir)]
+        distancias[:, :pedir] = 2 * RADIO_TIERRA_M * np.arcsin(np.clip(cuerdas.reshape(n, pedir) / 2, 0, 1))
+        return posiciones, distancias
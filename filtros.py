@@ -0,0 +1,84 @@
+"""Índice de filtros por columna basado en códigos categóricos"""
+import numpy as np
+import pandas as pd
+
+COLUMNAS_FILTRABLES = ["Ciudad", "Criticidad", "Subproceso"]
+# Valores de los selectores que equivalen a no filtrar
+SIN_FILTRO = {"Todas", "Todos"}
+
+
+def normalizar_seleccion(seleccion):
+    """Convierte una selección (valor, lista o "Todas") en lista, o None si no filtra"""
+    if seleccion is None:
+        return None
+    if isinstance(seleccion, str):
+        seleccion = [seleccion]
+    seleccion = [valor for valor in seleccion if valor not in SIN_FILTRO]
+    return seleccion or None
+
+
+def codigos_categoria(serie):
+    """Códigos enteros (int64) y categorías de una serie
+
+    El código -1 (vacío) pasa a len(categorias), así que cualquier tabla por
+    categoría con una casilla extra al final se consulta con `tabla[codigos]`.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype("category")
+    categorias = serie.cat.categories
+    codigos = serie.cat.codes.to_numpy().astype("int64")
+    codigos[codigos < 0] = len(categorias)
+    return codigos, categorias
+
+
+class IndiceFiltros:
+    """Códigos enteros por columna filtrable, calculados una vez por dataset
+
+    Combinar filtros es una consulta a una tabla de booleanos por columna y un
+    AND de máscaras; el resultado son posiciones de fila, no un DataFrame copiado.
+    """
+
+    def __init__(self, df, columnas=COLUMNAS_FILTRABLES):
+        self.n = len(df)
+        self.codigos = {}
+        self.valores = {}
+        for columna in columnas:
+            codigos, categorias = codigos_categoria(df[columna])
+            self.codigos[columna] = codigos
+            self.valores[columna] = pd.Index(categorias)
+
+    def mascara(self, selecciones):
+        """Máscara booleana de las filas que cumplen todas las selecciones"""
+        mascara = None
+        for columna, seleccion in selecciones.items():
+            seleccion = normalizar_seleccion(seleccion)
+            if seleccion is None:
+                continue
+            permitidos = np.zeros(len(self.valores[columna]) + 1, dtype=bool)
+            posiciones = self.valores[columna].get_indexer(seleccion)
+            permitidos[posiciones[posiciones >= 0]] = True
+            # La casilla extra del vacío nunca se permite
+            coincide = permitidos[self.codigos[columna]]
+            mascara = coincide if mascara is None else mascara & coincide
+        return mascara
+
+    def filas(self, selecciones):
+        """Posiciones de fila (ordenadas) que cumplen todas las selecciones"""
+        mascara = self.mascara(selecciones)
+        if mascara is None:
+            return np.arange(self.n, dtype="int64")
+        return np.flatnonzero(mascara)
+
+
+def en_filas(posiciones, filas):
+    """Máscara de las `posiciones` presentes en `filas` (ordenadas)"""
+    if len(filas) == 0 or len(posiciones) == 0:
+        return np.zeros(len(posiciones), dtype=bool)
+    ubicacion = np.searchsorted(filas, posiciones)
+    ubicacion[ubicacion == len(filas)] = len(filas) - 1
+    return filas[ubicacion] == posiciones
+
+
+def filtrar_posiciones(posiciones, filas):
+    """Conserva de `posiciones` las que están en `filas` (ordenadas)"""
+    return posiciones[en_filas(posiciones, filas)]
@@ -0,0 +1,439 @@
+"""Capa de geocodificación compartida con caché persistente y límite de tasa"""
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from texto import remove_accents
+
+# Nominatim permite como máximo una petición por segundo
+PETICIONES_POR_SEGUNDO = 1.0
+TTL_CACHE = 30 * 24 * 3600  # 30 días
+MAX_ENTRADAS_CACHE = 50000
+ESPERA_AUTOCOMPLETADO = 0.35  # segundos sin teclear antes de consultar
+MIN_CARACTERES_AUTOCOMPLETADO = 4
+# Permiten apuntar a un Nominatim propio (p. ej. "localhost:8080", "http")
+DOMINIO_NOMINATIM = os.environ.get("NOMINATIM_DOMINIO")
+ESQUEMA_NOMINATIM = os.environ.get("NOMINATIM_ESQUEMA")
+RUTA_CACHE_GEOCODIFICACION = os.environ.get(
+    "GEOCODIFICACION_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "continuidad", "geocodificacion.sqlite")
+)
+
+# Misma interfaz (address, latitude, longitude) que las ubicaciones de geopy
+Ubicacion = namedtuple("Ubicacion", ["address", "latitude", "longitude"])
+
+
+class LimitadorTasa:
+    """Cubeta de fichas compartida entre hilos"""
+
+    def __init__(self, tasa=PETICIONES_POR_SEGUNDO, capacidad=1):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._fichas = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea hasta que haya una ficha disponible"""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            time.sleep(espera)
+
+
+class CacheGeocodificacion:
+    """Caché SQLite con vencimiento (TTL) y desalojo LRU"""
+
+    def __init__(self, ruta=RUTA_CACHE_GEOCODIFICACION, ttl=TTL_CACHE, max_entradas=MAX_ENTRADAS_CACHE):
+        if ruta != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS geocodificacion ("
+            "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_usado ON geocodificacion (usado)")
+        self._conexion.commit()
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado o None si no existe o venció"""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT valor, creado FROM geocodificacion WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            if ahora - fila[1] > self.ttl:
+                self._conexion.execute("DELETE FROM geocodificacion WHERE clave = ?", (clave,))
+                self._conexion.commit()
+                return None
+            self._conexion.execute("UPDATE geocodificacion SET usado = ? WHERE clave = ?", (ahora, clave))
+            self._conexion.commit()
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor):
+        """Guarda un valor serializable en JSON y desaloja los menos usados"""
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO geocodificacion (clave, valor, creado, usado) VALUES (?, ?, ?, ?)",
+                (clave, json.dumps(valor), ahora, ahora)
+            )
+            sobrantes = self._conexion.execute("SELECT COUNT(*) FROM geocodificacion").fetchone()[0] - self.max_entradas
+            if sobrantes > 0:
+                self._conexion.execute(
+                    "DELETE FROM geocodificacion WHERE clave IN "
+                    "(SELECT clave FROM geocodificacion ORDER BY usado ASC LIMIT ?)", (sobrantes,)
+                )
+            self._conexion.commit()
+
+
+class _Pendiente:
+    """Consulta en curso que otros hilos pueden esperar"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = []
+        self.error = None
+
+
+class Geocodificador:
+    """Cliente único de geocodificación con caché, coalescencia y límite de tasa
+
+    `geocoder` puede ser cualquier objeto con la interfaz `geocode` de geopy,
+    lo que permite usar un geocodificador local de prueba. Sin él se usa
+    Nominatim en `dominio`/`esquema` (por defecto el servicio público).
+    """
+
+    def __init__(self, geocoder=None, cache=None, limitador=None, espera_autocompletado=ESPERA_AUTOCOMPLETADO,
+                 dominio=DOMINIO_NOMINATIM, esquema=ESQUEMA_NOMINATIM):
+        if geocoder is None:
+            from geopy.geocoders import Nominatim
+            opciones = {"domain": dominio} if dominio else {}
+            if esquema:
+                opciones["scheme"] = esquema
+            geocoder = Nominatim(user_agent="continuidad_app", timeout=10, **opciones)
+            # El país se restringe en cada consulta, no en el constructor
+            self.opciones_consulta = {"country_codes": "co"}
+        else:
+            self.opciones_consulta = {}
+        self.geocoder = geocoder
+        self.cache = cache if cache is not None else CacheGeocodificacion()
+        self.limitador = limitador if limitador is not None else LimitadorTasa()
+        self.espera_autocompletado = espera_autocompletado
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self._ultima_sugerencia = {}
+
+    @staticmethod
+    def _clave(consulta, limite):
+        return f"{limite}|{' '.join(consulta.casefold().split())}"
+
+    def _consultar(self, consulta, limite):
+        self.limitador.adquirir()
+        resultado = self.geocoder.geocode(consulta, exactly_one=False, limit=limite, **self.opciones_consulta)
+        return [[loc.address, loc.latitude, loc.longitude] for loc in (resultado or [])]
+
+    def buscar(self, consulta, limite=1, lanzar_errores=False):
+        """Geocodifica una consulta; devuelve una lista de Ubicacion
+
+        Con `lanzar_errores` los fallos del servicio se propagan en lugar de
+        devolver una lista vacía, para distinguirlos de "no encontrada".
+        """
+        clave = self._clave(consulta, limite)
+        guardado = self.cache.obtener(clave)
+        if guardado is not None:
+            return [Ubicacion(*fila) for fila in guardado]
+
+        with self._lock:
+            pendiente = self._en_curso.get(clave)
+            propietario = pendiente is None
+            if propietario:
+                pendiente = self._en_curso[clave] = _Pendiente()
+
+        if propietario:
+            try:
+                pendiente.resultado = self._consultar(consulta, limite)
+                self.cache.guardar(clave, pendiente.resultado)
+            except Exception as e:
+                # Los errores de red no se guardan en caché
+                pendiente.error = e
+            finally:
+                with self._lock:
+                    del self._en_curso[clave]
+                pendiente.evento.set()
+        else:
+            # Otra sesión ya está consultando lo mismo: se reutiliza su respuesta
+            pendiente.evento.wait()
+
+        if pendiente.error is not None and lanzar_errores:
+            raise pendiente.error
+        return [Ubicacion(*fila) for fila in pendiente.resultado]
+
+    def sugerir(self, texto, canal="default", limite=5):
+        """Sugerencias para autocompletado con espera anti-rebote por canal
+
+        Si llega un texto más reciente por el mismo canal durante la espera,
+        esta llamada se descarta sin consultar el servicio externo.
+        """
+        if not texto or len(texto.strip()) < MIN_CARACTERES_AUTOCOMPLETADO:
+            return []
+        consulta = f"{texto}, Colombia"
+        guardado = self.cache.obtener(self._clave(consulta, limite))
+        if guardado is not None:
+            return [Ubicacion(*fila) for fila in guardado]
+
+        marca = object()
+        with self._lock:
+            self._ultima_sugerencia[canal] = marca
+        time.sleep(self.espera_autocompletado)
+        with self._lock:
+            if self._ultima_sugerencia.get(canal) is not marca:
+                return []
+        return self.buscar(consulta, limite=limite)
+
+
+# Estados de resolución por fila de la geocodificación masiva
+ESTADO_ORIGINAL = "original"
+ESTADO_GEOCODIFICADA = "geocodificada"
+ESTADO_NO_ENCONTRADA = "no_encontrada"
+ESTADO_ERROR = "error"
+ESTADO_SIN_DIRECCION = "sin_direccion"
+
+
+def geocodificar_faltantes(df, geocodificador, max_trabajadores=4, progreso=None):
+    """Completa las coordenadas de las filas que no las tienen válidas
+
+    Las direcciones idénticas se consultan una sola vez, con un grupo acotado
+    de hilos que comparten el límite de tasa del geocodificador. Cada respuesta
+    queda en su caché persistente, así que una ejecución interrumpida se
+    reanuda sin repetir consultas. Devuelve el DataFrame enriquecido y una
+    Serie con el estado de resolución de cada fila.
+    """
+    latitudes = pd.to_numeric(df["Latitud"], errors="coerce")
+    longitudes = pd.to_numeric(df["Longitud"], errors="coerce")
+    validas = (latitudes.between(-90, 90) & longitudes.between(-180, 180)).to_numpy()
+
+    direcciones = df["Dirección"].fillna("").astype(str).str.strip()
+    ciudades = df["Ciudad"].fillna("").astype(str).str.strip()
+    consultas = direcciones + ciudades.where(ciudades == "", ", " + ciudades) + ", Colombia"
+    pendientes = ~validas & (direcciones != "").to_numpy()
+
+    estados = np.where(validas, ESTADO_ORIGINAL, ESTADO_SIN_DIRECCION).astype(object)
+    latitudes = latitudes.to_numpy(dtype="float64", na_value=np.nan).copy()
+    longitudes = longitudes.to_numpy(dtype="float64", na_value=np.nan).copy()
+
+    codigos, unicas = pd.factorize(consultas[pendientes])
+    lat_unicas = np.full(len(unicas), np.nan)
+    lon_unicas = np.full(len(unicas), np.nan)
+    estados_unicos = np.full(len(unicas), ESTADO_NO_ENCONTRADA, dtype=object)
+
+    if len(unicas):
+        with ThreadPoolExecutor(max_workers=max_trabajadores) as ejecutor:
+            futuros = {
+                ejecutor.submit(geocodificador.buscar, consulta, 1, True): posicion
+                for posicion, consulta in enumerate(unicas)
+            }
+            for hechas, futuro in enumerate(as_completed(futuros), start=1):
+                posicion = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception:
+                    estados_unicos[posicion] = ESTADO_ERROR
+                else:
+                    if resultado:
+                        lat_unicas[posicion] = resultado[0].latitude
+                        lon_unicas[posicion] = resultado[0].longitude
+                        estados_unicos[posicion] = ESTADO_GEOCODIFICADA
+                if progreso is not None:
+                    progreso(hechas, len(unicas))
+
+    latitudes[pendientes] = lat_unicas[codigos]
+    longitudes[pendientes] = lon_unicas[codigos]
+    estados[pendientes] = estados_unicos[codigos]
+
+    enriquecido = df.copy()
+    enriquecido["Latitud"] = latitudes
+    enriquecido["Longitud"] = longitudes
+    return enriquecido, pd.Series(estados, index=df.index, name="Estado geocodificación")
+
+
+# Alfabeto de las direcciones normalizadas; el resto se convierte en espacio
+ALFABETO_DIRECCIONES = " #0123456789abcdefghijklmnopqrstuvwxyz"
+_TABLA_ALFABETO = np.zeros(256, dtype="int32")
+for _posicion, _caracter in enumerate(ALFABETO_DIRECCIONES):
+    _TABLA_ALFABETO[ord(_caracter)] = _posicion
+LARGO_MAXIMO_DIRECCION = 80
+_NO_ALFANUMERICO = "[^a-z0-9#]+"
+_NO_ALFANUMERICO_RE = re.compile(_NO_ALFANUMERICO)
+
+
+def normalizar_direccion(texto):
+    """Forma canónica de una dirección: sin acentos, minúsculas y sin puntuación"""
+    return _NO_ALFANUMERICO_RE.sub(" ", remove_accents(str(texto)).lower()).strip()
+
+
+def normalizar_direcciones(textos):
+    """normalizar_direccion sobre textos distintos (p. ej. los únicos de pd.factorize)
+
+    Los acentos se quitan con remove_accents, uno por texto; el resto de la
+    limpieza es vectorizada sobre la Serie resultante.
+    """
+    sin_acentos = pd.Series([remove_accents(texto) for texto in textos], dtype="str")
+    return (sin_acentos.str.lower()
+            .str.replace(_NO_ALFANUMERICO, " ", regex=True)
+            .str.strip())
+
+
+def _codigos_trigramas(claves):
+    """Matriz de códigos de trigramas (-1 = relleno) para claves normalizadas"""
+    largo = min(max((len(c) for c in claves), default=0), LARGO_MAXIMO_DIRECCION) + 3
+    texto = "".join(f"  {c[:LARGO_MAXIMO_DIRECCION]} ".ljust(largo, "\0") for c in claves)
+    bytes_ = np.frombuffer(texto.encode("ascii"), dtype="uint8").reshape(len(claves), largo)
+    letras = _TABLA_ALFABETO[bytes_]
+    base = len(ALFABETO_DIRECCIONES)
+    codigos = letras[:, :-2] * base * base + letras[:, 1:-1] * base + letras[:, 2:]
+    codigos[bytes_[:, 2:] == 0] = -1
+    return codigos
+
+
+class IndiceDirecciones:
+    """Índice local de direcciones conocidas para autocompletar sin red
+
+    Combina búsqueda por prefijo (claves ordenadas + búsqueda binaria) con
+    coincidencia por trigramas para tolerar abreviaturas y errores leves.
+    Los trigramas se guardan como listas de posiciones en formato CSR.
+    """
+
+    def __init__(self, direcciones, latitudes, longitudes, umbral_trigramas=0.6):
+        serie = pd.Series(direcciones).reset_index(drop=True)
+        if serie.dtype == object:
+            # Valores que no son texto (números, None) no son direcciones
+            serie = serie.where(serie.map(lambda d: isinstance(d, str)))
+        serie = serie.astype("str")
+        validas = (serie.str.strip().str.len() > 0).fillna(False).to_numpy(dtype=bool)
+        latitudes = np.asarray(latitudes, dtype="float64")[validas]
+        longitudes = np.asarray(longitudes, dtype="float64")[validas]
+        serie = serie[validas].reset_index(drop=True)
+
+        # Se normaliza cada dirección distinta una sola vez, en bloque
+        codigos, unicas = pd.factorize(serie)
+        claves = pd.Series(normalizar_direcciones(unicas).to_numpy(dtype=object)[codigos])
+        primeras = ~claves.duplicated().to_numpy() & (claves != "").to_numpy()
+
+        self.umbral_trigramas = umbral_trigramas
+        self.direcciones = serie.to_numpy()[primeras]
+        self.latitudes = latitudes[primeras]
+        self.longitudes = longitudes[primeras]
+        self.claves = claves.to_numpy()[primeras]
+
+        self._orden_claves = np.argsort(self.claves, kind="stable")
+        self._claves_ordenadas = self.claves[self._orden_claves].tolist()
+
+        codigos = _codigos_trigramas(self.claves.tolist()) if len(self.claves) else np.empty((0, 0), dtype="int32")
+        filas = np.repeat(np.arange(len(self.claves), dtype="int32"), codigos.shape[1])
+        codigos = codigos.ravel()
+        # Pares (trigrama, fila) únicos ordenados por trigrama
+        pares = np.sort(codigos[codigos >= 0].astype("int64") * len(self.claves) + filas[codigos >= 0])
+        pares = pares[np.r_[True, pares[1:] != pares[:-1]]] if len(pares) else pares
+        base = len(ALFABETO_DIRECCIONES)
+        self._trigramas_inicio = np.searchsorted(pares // max(len(self.claves), 1), np.arange(base ** 3 + 1))
+        self._trigramas_filas = (pares % max(len(self.claves), 1)).astype("int32")
+
+    def __len__(self):
+        return len(self.claves)
+
+    def _ubicacion(self, posicion):
+        return Ubicacion(self.direcciones[posicion], float(self.latitudes[posicion]), float(self.longitudes[posicion]))
+
+    def exacta(self, direccion):
+        """Ubicación conocida para una dirección, o None"""
+        clave = normalizar_direccion(direccion)
+        inicio = bisect.bisect_left(self._claves_ordenadas, clave)
+        if inicio < len(self._claves_ordenadas) and self._claves_ordenadas[inicio] == clave:
+            return self._ubicacion(self._orden_claves[inicio])
+        return None
+
+    def buscar(self, texto, limite=5):
+        """Direcciones que empiezan por el texto o se le parecen"""
+        clave = normalizar_direccion(texto or "")
+        if not clave or not len(self):
+            return []
+
+        inicio = bisect.bisect_left(self._claves_ordenadas, clave)
+        resultados = []
+        for desplazamiento, encontrada in enumerate(self._claves_ordenadas[inicio:inicio + limite]):
+            if not encontrada.startswith(clave):
+                break
+            resultados.append(int(self._orden_claves[inicio + desplazamiento]))
+
+        if len(resultados) < limite:
+            consulta = np.unique(_codigos_trigramas([clave])[0])
+            consulta = consulta[consulta >= 0]
+            minimo = self.umbral_trigramas * len(consulta)
+            tramos = [
+                self._trigramas_filas[self._trigramas_inicio[c]:self._trigramas_inicio[c + 1]]
+                for c in consulta
+            ]
+            if tramos and minimo > 0:
+                conteos = np.bincount(np.concatenate(tramos), minlength=len(self))
+                mejores = np.flatnonzero(conteos >= minimo)
+                mejores = mejores[np.argsort(-conteos[mejores], kind="stable")]
+                vistos = set(resultados)
+                for posicion in mejores[:limite * 2].tolist():
+                    if len(resultados) >= limite:
+                        break
+                    if posicion not in vistos:
+                        resultados.append(posicion)
+        return [self._ubicacion(p) for p in resultados]
+
+
+class IndiceDiferido:
+    """Índice de direcciones que se construye en la primera búsqueda
+
+    Con rosters grandes construirlo cuesta segundos; así la carga del
+    dataset no lo paga si nadie busca direcciones. Se construye una sola vez
+    aunque varias sesiones busquen a la vez.
+    """
+
+    def __init__(self, construir):
+        self._construir = construir
+        self._indice = None
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        """IndiceDirecciones ya construido"""
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    self._indice = self._construir()
+                    self._construir = None
+        return self._indice
+
+    def __len__(self):
+        return len(self.obtener())
+
+    def exacta(self, direccion):
+        return self.obtener().exacta(direccion)
+
+    def buscar(self, texto, limite=5):
+        return self.obtener().buscar(texto, limite)
@@ -0,0 +1,85 @@
+"""Gráficas del reporte y del dashboard, renderizadas una sola vez a PNG
+
+Se usa matplotlib.figure.Figure directamente (sin pyplot): las figuras no
+quedan registradas en el estado global de matplotlib y se liberan en cuanto
+se guardan, así la memoria del servidor no crece con cada rerun.
+"""
+from io import BytesIO
+
+from matplotlib.figure import Figure
+
+TAMANO_GRAFICA = (8, 4)
+DPI_GRAFICA = 150
+
+
+def contar_valores(serie):
+    """value_counts sin las categorías que no aparecen en la serie"""
+    conteos = serie.value_counts()
+    return conteos[conteos > 0]
+
+
+def renderizar_png(dibujar, tamano=TAMANO_GRAFICA, dpi=DPI_GRAFICA):
+    """Dibuja en una figura nueva, la guarda como PNG y la libera"""
+    fig = Figure(figsize=tamano)
+    try:
+        dibujar(fig.add_subplot())
+        fig.tight_layout()
+        buffer = BytesIO()
+        fig.savefig(buffer, format="png", dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def _barras(conteo, titulo, color, horizontal=False):
+    def dibujar(ax):
+        conteo.plot(kind='barh' if horizontal else 'bar', ax=ax, color=color)
+        ax.set_title(titulo, fontsize=12)
+        ax.tick_params(axis='x', rotation=0 if horizontal else 45, labelsize=10)
+        ax.tick_params(axis='y', labelsize=10)
+    return dibujar
+
+
+def _torta(conteo, titulo):
+    def dibujar(ax):
+        conteo.plot(kind='pie', ax=ax, autopct='%1.1f%%', textprops={'fontsize': 10})
+        ax.set_title(titulo, fontsize=12)
+    return dibujar
+
+
+def agregados_reporte(reporte):
+    """Conteos que alimentan las gráficas del reporte, calculados una vez
+
+    Usa los totales del cubo (`reporte["agregados"]`) si el reporte los trae.
+    """
+    agregados = {}
+    if not reporte["sedes_afectadas"].empty:
+        agregados["sedes"] = reporte["sedes_afectadas"]["Nombre"].value_counts()
+    if not reporte["colaboradores_afectados"].empty:
+        colaboradores = reporte["colaboradores_afectados"]
+        totales = reporte.get("agregados") or {
+            "Criticidad": contar_valores(colaboradores["Criticidad"]),
+            "Subproceso": contar_valores(colaboradores["Subproceso"]),
+        }
+        agregados["criticidad"] = totales["Criticidad"]
+        agregados["subprocesos"] = totales["Subproceso"].head(5)
+    return agregados
+
+
+def graficas_reporte(reporte):
+    """PNG (bytes) de cada gráfica del reporte, en orden de presentación"""
+    agregados = agregados_reporte(reporte)
+    dibujos = {
+        "sedes": lambda conteo: _barras(conteo, 'Sedes Afectadas', 'salmon'),
+        "criticidad": lambda conteo: _torta(conteo, 'Distribución por Criticidad'),
+        "subprocesos": lambda conteo: _barras(conteo, 'Top 5 Subprocesos Afectados', 'lightgreen', horizontal=True),
+    }
+    return {nombre: renderizar_png(dibujos[nombre](conteo)) for nombre, conteo in agregados.items()}
+
+
+def graficas_dashboard(cubo):
+    """PNG (bytes) de las gráficas del dashboard general, a partir del cubo de conteos"""
+    return {
+        "ciudades": renderizar_png(_barras(cubo.totales("Ciudad").head(5), 'Top 5 Ciudades', 'skyblue')),
+        "sedes": renderizar_png(_barras(cubo.totales("Sede asignada").head(5), 'Top 5 Sedes', 'lightgreen')),
+    }
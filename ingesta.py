@@ -0,0 +1,134 @@
+"""Lectura tipada del CSV de colaboradores con caché Parquet por contenido"""
+import glob
+import hashlib
+import json
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_REQUERIDAS = ["Nombre", "Dirección", "Sede asignada", "Teléfono",
+                       "Ciudad", "Subproceso", "Criticidad", "Latitud", "Longitud"]
+COLUMNAS_CATEGORICAS = ["Ciudad", "Criticidad", "Subproceso", "Sede asignada"]
+TIPOS_COLUMNAS = {
+    **{columna: "category" for columna in COLUMNAS_CATEGORICAS},
+    "Nombre": "str",
+    "Dirección": "str",
+    "Teléfono": "str",
+}
+RUTA_SNAPSHOTS = os.environ.get(
+    "ROSTER_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "continuidad", "rosters")
+)
+# Subir al cambiar cómo se lee o limpia el CSV; los snapshots anteriores dejan de usarse
+VERSION_SNAPSHOT = 1
+MAX_SNAPSHOTS = 8  # Snapshots conservados (los de uso más reciente)
+TTL_SNAPSHOTS = 7 * 24 * 3600  # Segundos sin uso antes de borrar un snapshot
+
+
+class ColumnasFaltantesError(ValueError):
+    """El CSV no trae todas las columnas requeridas"""
+
+
+def huella_contenido(contenido):
+    """Hash del contenido del archivo, usado como versión del dataset"""
+    return hashlib.blake2b(contenido, digest_size=16).hexdigest()
+
+
+def esquema_snapshot():
+    """Etiqueta del formato de los snapshots: versión de lectura y tipos de columnas"""
+    texto = json.dumps([VERSION_SNAPSHOT, COLUMNAS_REQUERIDAS, TIPOS_COLUMNAS], sort_keys=True)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def podar_snapshots(ruta_snapshots, max_snapshots=MAX_SNAPSHOTS, ttl=TTL_SNAPSHOTS):
+    """Borra los snapshots de otro formato, los vencidos y los que sobran
+
+    La fecha de modificación hace de último uso (leer un snapshot la
+    actualiza). Cada snapshot es un roster completo con datos personales, así
+    que no se dejan acumular.
+    """
+    esquema = esquema_snapshot()
+    ahora = time.time()
+    vigentes = []
+    for ruta in glob.glob(os.path.join(ruta_snapshots, "*.parquet*")):
+        try:
+            modificado = os.path.getmtime(ruta)
+            vigente = ruta.endswith(f"-{esquema}.parquet") and ahora - modificado <= ttl
+            if not vigente and (ruta.endswith(".parquet") or ahora - modificado > ttl):
+                # Los temporales (.tmp) solo se borran vencidos: pueden estar escribiéndose
+                os.remove(ruta)
+            elif vigente:
+                vigentes.append((modificado, ruta))
+        except OSError:
+            continue
+    for _, ruta in sorted(vigentes, reverse=True)[max_snapshots:]:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _motor_csv():
+    try:
+        import pyarrow  # noqa: F401
+        return "pyarrow"
+    except ImportError:
+        return "c"
+
+
+def _leer_csv(contenido):
+    cabecera = pd.read_csv(BytesIO(contenido), nrows=0).columns
+    faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in cabecera]
+    if faltantes:
+        raise ColumnasFaltantesError(f"Faltan las columnas: {', '.join(faltantes)}")
+
+    df = pd.read_csv(BytesIO(contenido), dtype=TIPOS_COLUMNAS, engine=_motor_csv())
+    # Las coordenadas se leen sin tipo fijo para tolerar valores no numéricos
+    df["Latitud"] = pd.to_numeric(df["Latitud"], errors="coerce").astype("float64")
+    df["Longitud"] = pd.to_numeric(df["Longitud"], errors="coerce").astype("float64")
+    return df
+
+
+def leer_roster(contenido, ruta_snapshots=RUTA_SNAPSHOTS, huella=None):
+    """Lee el CSV (bytes) con tipos declarados; reutiliza el snapshot Parquet si existe
+
+    Devuelve el DataFrame tipado, aún sin filtrar coordenadas, y la huella
+    del contenido (se calcula si no se recibe). Sin pyarrow se lee con el
+    motor C y no se guardan snapshots. El nombre del snapshot lleva la
+    etiqueta de esquema_snapshot() y la carpeta se poda en cada lectura.
+    """
+    huella = huella or huella_contenido(contenido)
+    ruta = os.path.join(ruta_snapshots, f"{huella}-{esquema_snapshot()}.parquet") if ruta_snapshots else None
+
+    if ruta and os.path.isdir(ruta_snapshots):
+        podar_snapshots(ruta_snapshots)
+    if ruta and os.path.exists(ruta):
+        try:
+            df = pd.read_parquet(ruta)
+            os.utime(ruta)
+            return df, huella
+        except Exception:
+            # Snapshot dañado: se vuelve a leer el CSV
+            pass
+
+    df = _leer_csv(contenido)
+    if ruta and _motor_csv() == "pyarrow":
+        try:
+            os.makedirs(ruta_snapshots, mode=0o700, exist_ok=True)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            df.to_parquet(temporal, index=False)
+            os.replace(temporal, ruta)
+            podar_snapshots(ruta_snapshots)
+        except OSError:
+            pass
+    return df, huella
+
+
+def coordenadas_validas(df):
+    """Máscara de filas con coordenadas numéricas dentro de rango (NaN = inválida)"""
+    lat = df["Latitud"].to_numpy(dtype="float64", na_value=np.nan)
+    lon = df["Longitud"].to_numpy(dtype="float64", na_value=np.nan)
+    return (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
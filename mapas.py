@@ -0,0 +1,118 @@
+"""Construcción de los mapas folium de la app, sin depender de Streamlit
+
+La app y los benchmarks arman el mapa con estas mismas funciones.
+"""
+import json
+
+import folium
+import numpy as np
+from folium.plugins import Draw, LocateControl, Fullscreen, FastMarkerCluster
+
+# Escala YlOrRd de menor a mayor densidad
+COLORES_DENSIDAD = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+
+TILES = {
+    "MapLibre": {
+        "url": "https://api.maptiler.com/maps/streets/{z}/{x}/{y}.png?key=dhEAG0dMVs2vmsaHdReR",
+        "attr": '<a href="https://www.maptiler.com/copyright/" target="_blank">© MapTiler</a>'
+    },
+    "OpenStreetMap": {
+        "url": "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
+        "attr": 'OpenStreetMap'
+    }
+}
+
+# Los popups se construyen en el navegador solo cuando se abren
+CALLBACK_COLABORADOR = """function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon({icon: 'user', prefix: 'fa', markerColor: 'lightblue'}));
+    marker.bindPopup(function () {
+        return '<b>' + row[2] + '</b><br>Sede: ' + row[3] + '<br>Subproceso: ' + row[4] + '<br>Criticidad: ' + row[5];
+    });
+    return marker;
+}"""
+
+CALLBACK_SEDE = """function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon({icon: row[5], prefix: 'fa', markerColor: row[4]}));
+    marker.bindPopup(function () { return '<b>' + row[2] + '</b><br>' + row[3]; });
+    return marker;
+}"""
+
+
+def crear_mapa_base(location=[4.5709, -74.2973], zoom_start=12, tile_provider="MapLibre"):
+    """Crea mapa base optimizado"""
+    m = folium.Map(
+        location=location,
+        zoom_start=zoom_start,
+        tiles=TILES[tile_provider]["url"],
+        attr=TILES[tile_provider]["attr"],
+        control_scale=True,
+        prefer_canvas=True
+    )
+
+    LocateControl(auto_start=False).add_to(m)
+    Fullscreen().add_to(m)
+
+    Draw(
+        export=True,
+        position="topleft",
+        draw_options={
+            'polyline': False,
+            'rectangle': True,
+            'polygon': True,
+            'circle': True,
+            'marker': False
+        }
+    ).add_to(m)
+
+    return m
+
+
+def capa_sedes(datos):
+    """Crea una sola capa con las sedes del catálogo (filas de RegistroSedes.datos_capa)"""
+    return FastMarkerCluster(
+        datos,
+        callback=CALLBACK_SEDE,
+        name="Sedes",
+        disable_clustering_at_zoom=11
+    )
+
+
+def capa_colaboradores(datos):
+    """Crea una sola capa con todos los colaboradores"""
+    return FastMarkerCluster(
+        datos,
+        callback=CALLBACK_COLABORADOR,
+        name="Colaboradores",
+        max_cluster_radius=50,
+        disable_clustering_at_zoom=14
+    )
+
+
+def capa_densidad(celdas):
+    """Capa de celdas coloreadas por cantidad de colaboradores y tamaño de su GeoJSON"""
+    grupo = folium.FeatureGroup(name="Densidad")
+    if celdas.empty:
+        return grupo, 0
+    clases = np.minimum((np.sqrt(celdas["Total"] / celdas["Total"].max()) * len(COLORES_DENSIDAD)).astype(int),
+                        len(COLORES_DENSIDAD) - 1)
+    columnas = [c for c in celdas.columns if c not in ("Sur", "Oeste", "Norte", "Este")]
+    features = []
+    for celda, clase in zip(celdas.itertuples(index=False), clases):
+        sur, oeste, norte, este = celda[:4]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [[
+                [oeste, sur], [este, sur], [este, norte], [oeste, norte], [oeste, sur]
+            ]]},
+            "properties": {**{c: int(v) for c, v in zip(columnas, celda[4:])}, "color": COLORES_DENSIDAD[clase]}
+        })
+    geojson = {"type": "FeatureCollection", "features": features}
+    folium.GeoJson(
+        geojson,
+        style_function=lambda feature: {"fillColor": feature["properties"]["color"], "color": "#555555",
+                                        "weight": 0.5, "fillOpacity": 0.6},
+        tooltip=folium.GeoJsonTooltip(fields=columnas)
+    ).add_to(grupo)
+    return grupo, len(json.dumps(geojson))
@@ -0,0 +1,383 @@
+"""Motor de análisis de impacto, independiente de Streamlit
+
+Carga y limpieza del roster, filtros, datos de la capa del mapa, reportes
+por zona, plan de reubicación y PDF. Lo usan la app, la línea de comandos
+(cli.py) y los benchmarks. matplotlib, fpdf y geopy se importan solo al
+generar gráficas, PDF o geocodificar, así que importar el motor es rápido.
+"""
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import shape
+
+from areas import COLUMNA_AREA, resumen_areas
+from cubo import CuboAgregados, COLUMNAS_CUBO
+from densidad import PiramideDensidad
+from espacial import (puntos_en_zona, puntos_en_circulo, pertenencia_zonas, es_circulo, datos_circulo,
+                      IndiceEspacial)
+from filtros import IndiceFiltros, COLUMNAS_FILTRABLES, filtrar_posiciones, en_filas
+from geocodificacion import IndiceDirecciones, IndiceDiferido, geocodificar_faltantes
+from ingesta import leer_roster, coordenadas_validas, RUTA_SNAPSHOTS
+from texto import texto_latin1, columna_sin_acentos
+
+K_SEDES_ALTERNAS = 3  # Sedes sugeridas por colaborador en el plan de reubicación
+
+
+def version_dataset(huella, geocodificado=False, areas=None):
+    """Identidad del dataset procesado: contenido del CSV, si se geocodificó y
+    con qué catálogo de áreas
+
+    Dos cargas del mismo archivo producen filas distintas si una completa las
+    coordenadas faltantes o asigna otras áreas; las cachés de la app se
+    indexan con esta versión.
+    """
+    return (huella, bool(geocodificado), areas.version if areas is not None else None)
+
+
+def cargar_dataset(contenido, geocodificador=None, huella=None, areas=None, ruta_snapshots=RUTA_SNAPSHOTS,
+                   progreso=None):
+    """Carga y limpia el CSV completo (bytes) y construye sus índices
+
+    Con `geocodificador` se completan antes las filas sin coordenadas válidas;
+    con `areas` (CatalogoAreas) se agrega la columna de área administrativa.
+    Con `ruta_snapshots=None` siempre se lee el CSV (sin snapshot Parquet).
+    `progreso(hechas, total)` recibe el avance de la geocodificación.
+    Lanza ColumnasFaltantesError si el CSV no trae las columnas requeridas.
+    """
+    # Lectura tipada en una sola pasada, o desde el snapshot Parquet si ya se leyó
+    df, huella = leer_roster(contenido, ruta_snapshots, huella)
+
+    # Geocodificación opcional de las filas sin coordenadas válidas
+    estados = None
+    if geocodificador is not None:
+        df, estados = geocodificar_faltantes(df, geocodificador, progreso=progreso)
+
+    # Limpieza de datos: una sola máscara vectorizada
+    # (tras reset_index la posición de fila coincide con la etiqueta)
+    validas = coordenadas_validas(df)
+    df = df[validas].reset_index(drop=True)
+    if estados is not None:
+        df["Estado geocodificación"] = estados.to_numpy()[validas]
+
+    # Área administrativa de cada colaborador (un solo cruce espacial indexado)
+    if areas is not None:
+        df[COLUMNA_AREA] = areas.asignar(df["Latitud"].to_numpy(), df["Longitud"].to_numpy())
+    columnas_area = [COLUMNA_AREA] if areas is not None else []
+
+    # Índice espacial sobre las coordenadas limpias
+    indice = IndiceEspacial(df["Latitud"].to_numpy(), df["Longitud"].to_numpy())
+    # El índice de direcciones se construye en la primera búsqueda, no al cargar
+    direcciones = IndiceDiferido(partial(IndiceDirecciones, df["Dirección"], df["Latitud"].to_numpy(),
+                                         df["Longitud"].to_numpy()))
+    return {"df": df, "indice": indice, "direcciones": direcciones,
+            "filtros": IndiceFiltros(df, COLUMNAS_FILTRABLES + columnas_area),
+            "cubo": CuboAgregados(df, COLUMNAS_CUBO + columnas_area),
+            "densidad": PiramideDensidad(df["Latitud"], df["Longitud"], df["Criticidad"]),
+            "geocodificacion": estados, "version": version_dataset(huella, geocodificador is not None, areas)}
+
+
+def filtrar(indice_filtros, ciudad=None, criticidad=None, subproceso=None, area=None):
+    """Posiciones de fila que cumplen los filtros (None o vacío = sin filtro)"""
+    selecciones = {"Ciudad": ciudad, "Criticidad": criticidad, "Subproceso": subproceso}
+    if COLUMNA_AREA in indice_filtros.codigos:
+        selecciones[COLUMNA_AREA] = area
+    return indice_filtros.filas(selecciones)
+
+
+def datos_para_mapa(df, indice, maximo, filas=None):
+    """Reduce de forma determinista las filas que se dibujan en el mapa"""
+    if filas is None:
+        filas = np.arange(len(df))
+    if len(filas) > maximo:
+        filas = indice.muestra_estratificada(filas, maximo)
+    return df.iloc[filas]
+
+
+def filas_capa_colaboradores(df):
+    """Filas compactas [lat, lon, nombre, sede, subproceso, criticidad] para el mapa"""
+    filas = df[["Nombre", "Sede asignada", "Subproceso", "Criticidad"]].astype(str)
+    filas.insert(0, "Longitud", df["Longitud"].round(5))
+    filas.insert(0, "Latitud", df["Latitud"].round(5))
+    return filas.to_numpy().tolist()
+
+
+def colaboradores_con_sede(df, sedes, posiciones_sedes, filas=None):
+    """Colaboradores cuya sede asignada está entre las posiciones dadas del registro"""
+    asignadas = sedes.posiciones_asignadas(df["Sede asignada"])
+    posiciones = np.flatnonzero(np.isin(asignadas, posiciones_sedes))
+    if filas is not None:
+        posiciones = filtrar_posiciones(posiciones, filas)
+    return df.iloc[posiciones]
+
+
+def generar_reporte(zona_dibujada, df, sedes, indice=None, filas=None):
+    """Genera reporte con contención vectorizada sobre las coordenadas"""
+    if not zona_dibujada or 'geometry' not in zona_dibujada:
+        return None
+
+    if es_circulo(zona_dibujada):
+        # Círculo geodésico: filtro por distancia, ordenado por cercanía al centro
+        lat, lon, radio = datos_circulo(zona_dibujada)
+        if indice is not None:
+            posiciones, distancias = indice.consultar_circulo(lat, lon, radio)
+        else:
+            posiciones, distancias = puntos_en_circulo(df["Latitud"].to_numpy(), df["Longitud"].to_numpy(), lat, lon, radio)
+        if filas is not None:
+            en_filtro = en_filas(posiciones, filas)
+            posiciones, distancias = posiciones[en_filtro], distancias[en_filtro]
+        orden = np.argsort(distancias, kind="stable")
+        colaboradores_afectados = df.iloc[posiciones[orden]].assign(**{"Distancia al centro (m)": distancias[orden].round(1)})
+    else:
+        zona_shape = shape(zona_dibujada['geometry'])
+        if indice is not None:
+            # Solo se evalúan los candidatos del índice
+            posiciones = indice.consultar(zona_shape)
+        else:
+            # Contención en bloque sobre los arreglos de coordenadas
+            posiciones = np.flatnonzero(puntos_en_zona(df["Latitud"].to_numpy(), df["Longitud"].to_numpy(), zona_shape))
+        if filas is not None:
+            # Posiciones que cumplen los filtros activos
+            posiciones = filtrar_posiciones(posiciones, filas)
+        colaboradores_afectados = df.iloc[posiciones]
+
+    posiciones_sedes = sedes.en_zona(zona_dibujada)
+    sedes_afectadas = sedes.tabla(posiciones_sedes)
+
+    return {
+        "total_colaboradores": len(colaboradores_afectados),
+        "total_sedes": len(sedes_afectadas),
+        "colaboradores_afectados": colaboradores_afectados,
+        "sedes_afectadas": sedes_afectadas,
+        "colaboradores_sede_afectada": colaboradores_con_sede(df, sedes, posiciones_sedes, filas),
+        "areas_afectadas": resumen_areas(colaboradores_afectados),
+        "zona": zona_dibujada
+    }
+
+
+def describir_zona(zona):
+    """Tipo legible de una zona dibujada"""
+    if es_circulo(zona):
+        return f"Círculo ({datos_circulo(zona)[2]:.0f} m)"
+    return "Polígono"
+
+
+def zonas_por_fila(matriz, etiquetas):
+    """Texto con las zonas a las que pertenece cada fila de la matriz de pertenencia"""
+    texto = np.full(len(matriz), "", dtype=object)
+    for columna, etiqueta in enumerate(etiquetas):
+        texto[matriz[:, columna]] += etiqueta + ", "
+    return [t[:-2] for t in texto]
+
+
+def generar_reporte_zonas(zonas, df, sedes, indice=None, filas=None):
+    """Genera un reporte conjunto de varias zonas con una sola pasada sobre los datos"""
+    zonas = [zona for zona in zonas if zona and 'geometry' in zona]
+    if not zonas:
+        return None
+
+    # Con índice cada zona solo mira las celdas de su caja; sin él, todas las filas
+    if indice is not None:
+        posiciones, matriz = indice.pertenencia_zonas(zonas)
+    else:
+        posiciones = np.arange(len(df))
+        matriz = pertenencia_zonas(df["Latitud"].to_numpy(), df["Longitud"].to_numpy(), zonas)
+    if filas is not None:
+        conservar = en_filas(posiciones, filas)
+        posiciones, matriz = posiciones[conservar], matriz[conservar]
+    union = matriz.any(axis=1)
+    etiquetas = [f"Zona {i + 1}" for i in range(len(zonas))]
+    colaboradores_afectados = df.iloc[posiciones[union]].assign(Zonas=zonas_por_fila(matriz[union], etiquetas))
+
+    matriz_sedes = sedes.en_zonas(zonas)
+    union_sedes = np.flatnonzero(matriz_sedes.any(axis=1))
+    sedes_afectadas = sedes.tabla(union_sedes).assign(Zonas=zonas_por_fila(matriz_sedes[union_sedes], etiquetas))
+
+    desglose = pd.DataFrame({
+        "Zona": etiquetas,
+        "Tipo": [describir_zona(zona) for zona in zonas],
+        "Colaboradores": matriz.sum(axis=0),
+        "Sedes": matriz_sedes.sum(axis=0)
+    })
+
+    return {
+        "total_colaboradores": len(colaboradores_afectados),
+        "total_sedes": len(sedes_afectadas),
+        "colaboradores_afectados": colaboradores_afectados,
+        "sedes_afectadas": sedes_afectadas,
+        "colaboradores_sede_afectada": colaboradores_con_sede(df, sedes, union_sedes, filas),
+        "areas_afectadas": resumen_areas(colaboradores_afectados),
+        "zona": {"type": "FeatureCollection", "features": zonas},
+        "zonas": desglose
+    }
+
+
+def plan_reubicacion(reporte, indice, k=K_SEDES_ALTERNAS):
+    """Asigna a cada colaborador afectado las k sedes no afectadas más cercanas"""
+    afectados = reporte["colaboradores_afectados"]
+    excluir = reporte["sedes_afectadas"]["Nombre"].tolist() if not reporte["sedes_afectadas"].empty else []
+    posiciones, distancias = indice.cercanas(
+        afectados["Latitud"].to_numpy(), afectados["Longitud"].to_numpy(), k=k, excluir=excluir
+    )
+    nombres = np.append(indice.nombres, None)  # la posición -1 apunta a "sin sede"
+    plan = afectados[["Nombre", "Sede asignada", "Subproceso", "Criticidad"]].copy()
+    for opcion in range(k):
+        plan[f"Sede sugerida {opcion + 1}"] = nombres[posiciones[:, opcion]]
+        plan[f"Distancia {opcion + 1} (km)"] = (distancias[:, opcion] / 1000).round(2)
+    return plan
+
+
+def analizar_zona(zona, carga, sedes, filas=None):
+    """Reporte completo de una zona (Feature) o de varias (FeatureCollection)
+
+    Incluye el plan de reubicación y los totales del cubo para las gráficas.
+    Devuelve None si la zona no tiene geometría.
+    """
+    if zona.get("type") == "FeatureCollection":
+        reporte = generar_reporte_zonas(zona["features"], carga["df"], sedes, indice=carga["indice"], filas=filas)
+    else:
+        reporte = generar_reporte(zona, carga["df"], sedes, indice=carga["indice"], filas=filas)
+    if reporte:
+        reporte["reubicacion"] = plan_reubicacion(reporte, sedes.arbol)
+        # Tras reset_index en cargar_dataset, el índice de las filas es su posición
+        reporte["agregados"] = carga["cubo"].marginales(reporte["colaboradores_afectados"].index.to_numpy(),
+                                                        ["Criticidad", "Subproceso"])
+    return reporte
+
+
+# Columnas de la tabla de colaboradores del PDF: (columna, título, ancho, caracteres)
+COLUMNAS_PDF = [
+    ("Nombre", "Nombre", 60, 25),
+    ("Sede asignada", "Sede", 50, 20),
+    ("Subproceso", "Subproceso", 50, 20),
+    ("Criticidad", "Criticidad", 30, 12),
+]
+
+
+def tabla_colaboradores_pdf(pdf, colaboradores):
+    """Escribe la tabla completa de colaboradores, repitiendo el encabezado en cada página"""
+    from fpdf import XPos, YPos
+
+    # Texto normalizado una vez por columna (por valor distinto, no por celda)
+    columnas = [columna_sin_acentos(colaboradores[columna], largo) for columna, _, _, largo in COLUMNAS_PDF]
+    anchos = [ancho for _, _, ancho, _ in COLUMNAS_PDF]
+
+    def encabezado():
+        pdf.set_font("helvetica", 'B', 8)
+        pdf.set_fill_color(200, 220, 255)
+        for _, titulo, ancho, _ in COLUMNAS_PDF:
+            pdf.cell(ancho, 6, titulo, border=1, align='C', fill=True)
+        pdf.ln()
+        pdf.set_font("helvetica", size=8)
+
+    encabezado()
+    for fila in zip(*columnas):
+        if pdf.get_y() + 6 > pdf.page_break_trigger:
+            pdf.add_page()
+            encabezado()
+        for valor, ancho in zip(fila[:-1], anchos[:-1]):
+            pdf.cell(ancho, 6, valor, border=1)
+        pdf.cell(anchos[-1], 6, fila[-1], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def crear_pdf(reporte, tipo_evento, descripcion_emergencia="", graficas=None, ubicacion=None):
+    """Crea un PDF con el reporte de emergencia
+
+    `graficas` son los PNG ya renderizados (se generan si no se reciben) y
+    `ubicacion` la dirección del punto de emergencia, si se conoce.
+    """
+    from fpdf import FPDF, XPos, YPos
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", size=12)
+
+    pdf.set_font("helvetica", 'B', 16)
+    pdf.cell(200, 10, text="REPORTE DE EMERGENCIA - COLMÉDICA", align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font("helvetica", size=12)
+    pdf.cell(200, 10, text=f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(10)
+
+    pdf.set_font("helvetica", 'B', 14)
+    pdf.cell(200, 10, text="Información del Evento", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font("helvetica", size=12)
+    pdf.cell(200, 10, text=f"Tipo de evento: {texto_latin1(tipo_evento)}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    descripcion_simple = texto_latin1(descripcion_emergencia)
+    pdf.multi_cell(0, 10, text=f"Descripción: {descripcion_simple}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(10)
+
+    pdf.set_font("helvetica", 'B', 14)
+    pdf.cell(200, 10, text="Resumen de la Emergencia", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font("helvetica", size=12)
+    pdf.cell(200, 10, text=f"Total colaboradores afectados: {reporte['total_colaboradores']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.cell(200, 10, text=f"Total sedes afectadas: {reporte['total_sedes']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    if ubicacion:
+        ubicacion_simple = texto_latin1(ubicacion)
+        pdf.cell(200, 10, text=f"Ubicación: {ubicacion_simple}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(10)
+
+    if "zonas" in reporte:
+        pdf.set_font("helvetica", 'B', 14)
+        pdf.cell(200, 10, text="Desglose por Zona", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("helvetica", size=10)
+        pdf.set_fill_color(200, 220, 255)
+        pdf.cell(30, 6, "Zona", border=1, align='C', fill=True)
+        pdf.cell(60, 6, "Tipo", border=1, align='C', fill=True)
+        pdf.cell(40, 6, "Colaboradores", border=1, align='C', fill=True)
+        pdf.cell(30, 6, "Sedes", border=1, align='C', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        for _, row in reporte["zonas"].iterrows():
+            pdf.cell(30, 6, text=texto_latin1(str(row["Zona"])), border=1)
+            pdf.cell(60, 6, text=texto_latin1(row["Tipo"]), border=1)
+            pdf.cell(40, 6, text=str(row["Colaboradores"]), border=1)
+            pdf.cell(30, 6, text=str(row["Sedes"]), border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.ln(10)
+
+    if not reporte.get("areas_afectadas", pd.DataFrame()).empty:
+        areas_afectadas = reporte["areas_afectadas"]
+        # Área, total y hasta tres niveles de criticidad
+        columnas = list(areas_afectadas.columns[:5])
+        anchos = [70, 35] + [28] * (len(columnas) - 2)
+        pdf.set_font("helvetica", 'B', 14)
+        pdf.cell(200, 10, text="Áreas Afectadas", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("helvetica", size=10)
+        pdf.set_fill_color(200, 220, 255)
+        for columna, ancho in zip(columnas, anchos):
+            pdf.cell(ancho, 6, texto_latin1(str(columna))[:18], border=1, align='C', fill=True)
+        pdf.ln()
+        textos = [columna_sin_acentos(areas_afectadas[columna], 30) for columna in columnas]
+        for fila in zip(*textos):
+            for valor, ancho in zip(fila, anchos):
+                pdf.cell(ancho, 6, text=valor, border=1)
+            pdf.ln()
+        pdf.ln(10)
+
+    if graficas is None:
+        from graficas import graficas_reporte
+        graficas = graficas_reporte(reporte)
+    for png in graficas.values():
+        pdf.add_page()
+        pdf.image(BytesIO(png), x=10, w=190)
+
+    if not reporte["sedes_afectadas"].empty:
+        pdf.add_page()
+        pdf.set_font("helvetica", 'B', 14)
+        pdf.cell(200, 10, text="Sedes Afectadas", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("helvetica", size=10)
+
+        for _, row in reporte["sedes_afectadas"].iterrows():
+            nombre_simple = texto_latin1(row['Nombre'])
+            direccion_simple = texto_latin1(row['Dirección'])
+            pdf.multi_cell(0, 6, text=f"- {nombre_simple}: {direccion_simple}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.ln(2)
+
+    if not reporte["colaboradores_afectados"].empty:
+        pdf.add_page()
+        pdf.set_font("helvetica", 'B', 14)
+        pdf.cell(200, 10, text=f"Colaboradores Afectados ({len(reporte['colaboradores_afectados'])})", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        tabla_colaboradores_pdf(pdf, reporte["colaboradores_afectados"])
+
+    return bytes(pdf.output())
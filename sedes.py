@@ -0,0 +1,263 @@
+"""Registro de sedes con índice espacial y cruce con la sede asignada del roster"""
+import json
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from espacial import IndiceEspacial, IndiceSedes, es_circulo, datos_circulo
+from filtros import codigos_categoria
+from geocodificacion import IndiceDirecciones
+from ingesta import huella_contenido
+from texto import remove_accents
+
+COLOR_SEDE = "blue"
+ICONO_SEDE = "hospital"
+# Nombres aceptados para cada columna del catálogo (CSV o propiedades GeoJSON)
+ALIAS_COLUMNAS = {
+    "Nombre": ["nombre", "name", "sede"],
+    "Dirección": ["direccion", "address"],
+    "Latitud": ["latitud", "lat", "latitude"],
+    "Longitud": ["longitud", "lon", "lng", "longitude"],
+    "Color": ["color"],
+    "Icono": ["icono", "icon"],
+}
+
+# Catálogo de sedes por defecto (se puede reemplazar subiendo un CSV o GeoJSON)
+SEDES_FIJAS = {
+    "Colmédica Belaire": {
+        "direccion": "Centro Comercial Belaire Plaza, Cl. 153 #6-65, Bogotá",
+        "coordenadas": [4.729454000113993, -74.02444216931787],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Bulevar Niza": {
+        "direccion": "Centro Comercial Bulevar Niza, Av. Calle 58 #127-59, Bogotá",
+        "coordenadas": [4.712693239837536, -74.07140074602322],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Calle 185": {
+        "direccion": "Centro Comercial Santafé, Cl. 185 #45-03, Bogotá",
+        "coordenadas": [4.763543959141223, -74.04612616931786],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Cedritos": {
+        "direccion": "Edificio HHC, Cl. 140 #11-45, Bogotá",
+        "coordenadas": [4.718879348342116, -74.03609218650581],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Chapinero": {
+        "direccion": "Cr. 7 #52-53, Chapinero, Bogotá",
+        "coordenadas": [4.640908410923512, -74.06373898409286],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Colina Campestre": {
+        "direccion": "Centro Comercial Sendero de la Colina, Cl. 151 #54-15, Bogotá",
+        "coordenadas": [4.73397996072128, -74.05613864417634],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Centro Médico Colmédica Country Park": {
+        "direccion": "Autopista Norte No 122 - 96, Bogotá",
+        "coordenadas": [4.670067290638234, -74.05758327116473],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Metrópolis": {
+        "direccion": "Centro Comercial Metrópolis, Av. Cra. 68 #75A-50, Bogotá",
+        "coordenadas": [4.6812256618088615, -74.08315698409288],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Multiplaza": {
+        "direccion": "Centro Comercial Multiplaza, Cl. 19A #72-57, Bogotá",
+        "coordenadas": [4.652573284106405, -74.12629091534289],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Plaza Central": {
+        "direccion": "Centro Comercial Plaza Central, Cra. 65 #11-50, Bogotá",
+        "coordenadas": [4.633464230539147, -74.11621916981814],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Salitre Capital": {
+        "direccion": "Capital Center II, Av. Cl. 26 #69C-03, Bogotá",
+        "coordenadas": [4.660602588141229, -74.10864383068576],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Suba": {
+        "direccion": "Alpaso Plaza, Av. Cl. 145 #103B-69, Bogotá",
+        "coordenadas": [4.7499608085787575, -74.08737693178564],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Centro Médico Torre Santa Bárbara": {
+        "direccion": "Autopista Norte No 122 - 96, Bogotá",
+        "coordenadas": [4.70404406297091, -74.053790252428],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Unicentro Occidente": {
+        "direccion": "Centro Comercial Unicentro Occidente, Cra. 111C #86-05, Bogotá",
+        "coordenadas": [4.724354935414492, -74.11430016931786],
+        "color": "blue",
+        "icono": "hospital"
+    },
+    "Colmédica Usaquén": {
+        "direccion": "Centro Comercial Usaquén, Cra. 7 #120-20, Bogotá",
+        "coordenadas": [4.6985109910547695, -74.03076183068214],
+        "color": "blue",
+        "icono": "hospital"
+    }
+}
+
+
+def _clave_nombre(nombre):
+    return " ".join(remove_accents(str(nombre)).casefold().split())
+
+
+def _destino_columna(columna):
+    # Nombre canónico (clave de ALIAS_COLUMNAS) de una columna, o None
+    clave = _clave_nombre(columna)
+    for destino, alias in ALIAS_COLUMNAS.items():
+        if clave == _clave_nombre(destino) or clave in alias:
+            return destino
+    return None
+
+
+def _normalizar_columnas(df):
+    renombrar = {columna: _destino_columna(columna) for columna in df.columns}
+    renombrar = {columna: destino for columna, destino in renombrar.items() if destino is not None}
+    destinos = list(renombrar.values())
+    repetidas = [destino for destino in ALIAS_COLUMNAS if destinos.count(destino) > 1]
+    if repetidas:
+        raise ValueError("El catálogo de sedes tiene varias columnas para: " + ", ".join(
+            f"{destino} ({', '.join(str(c) for c, d in renombrar.items() if d == destino)})" for destino in repetidas))
+    df = df.rename(columns=renombrar)
+    faltantes = [c for c in ["Nombre", "Latitud", "Longitud"] if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"El catálogo de sedes no tiene las columnas: {', '.join(faltantes)}")
+    if "Dirección" not in df.columns:
+        df["Dirección"] = ""
+    df["Color"] = df["Color"].fillna(COLOR_SEDE) if "Color" in df.columns else COLOR_SEDE
+    df["Icono"] = df["Icono"].fillna(ICONO_SEDE) if "Icono" in df.columns else ICONO_SEDE
+    df["Latitud"] = pd.to_numeric(df["Latitud"], errors="coerce")
+    df["Longitud"] = pd.to_numeric(df["Longitud"], errors="coerce")
+    validas = df["Latitud"].between(-90, 90) & df["Longitud"].between(-180, 180) & df["Nombre"].notna()
+    # Filas repetidas se descartan; el mismo nombre en otro lugar es ambiguo
+    # porque el roster cruza la sede asignada solo por nombre
+    df = df[validas].drop_duplicates(subset=["Nombre", "Latitud", "Longitud"]).reset_index(drop=True)
+    df["Nombre"] = df["Nombre"].astype(str)
+    claves = df["Nombre"].map(_clave_nombre)
+    repetidos = df.loc[claves.duplicated(keep=False), "Nombre"].drop_duplicates()
+    if not repetidos.empty:
+        raise ValueError("El catálogo de sedes tiene nombres repetidos con distintas coordenadas: "
+                         + ", ".join(repetidos.head(5)) + ("..." if len(repetidos) > 5 else ""))
+    df["Dirección"] = df["Dirección"].fillna("").astype(str)
+    return df[["Nombre", "Dirección", "Latitud", "Longitud", "Color", "Icono"]]
+
+
+class RegistroSedes:
+    """Catálogo de sedes indexado para consultas por zona y por nombre
+
+    Guarda una rejilla espacial para las zonas, un árbol KD para las sedes
+    más cercanas, el índice de sus direcciones para autocompletar y un
+    diccionario de nombres normalizados para cruzar la columna "Sede
+    asignada" del roster sin comparar cadenas fila por fila.
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version or huella_contenido(df.to_csv(index=False).encode("utf-8"))
+        self.latitudes = df["Latitud"].to_numpy(dtype="float64")
+        self.longitudes = df["Longitud"].to_numpy(dtype="float64")
+        self.nombres = df["Nombre"].to_numpy(dtype=object)
+        self.indice = IndiceEspacial(self.latitudes, self.longitudes)
+        self.arbol = IndiceSedes(self.nombres, self.latitudes, self.longitudes)
+        self.direcciones = IndiceDirecciones(df["Dirección"], self.latitudes, self.longitudes)
+        self._por_nombre = {_clave_nombre(n): i for i, n in enumerate(self.nombres)}
+
+    def __len__(self):
+        return len(self.df)
+
+    @classmethod
+    def desde_diccionario(cls, sedes):
+        """Registro a partir del formato de SEDES_FIJAS"""
+        df = pd.DataFrame([
+            {
+                "Nombre": nombre,
+                "Dirección": datos["direccion"],
+                "Latitud": datos["coordenadas"][0],
+                "Longitud": datos["coordenadas"][1],
+                "Color": datos.get("color", COLOR_SEDE),
+                "Icono": datos.get("icono", ICONO_SEDE)
+            }
+            for nombre, datos in sedes.items()
+        ])
+        return cls(_normalizar_columnas(df))
+
+    @classmethod
+    def desde_archivo(cls, contenido, nombre_archivo):
+        """Registro a partir de un CSV o GeoJSON (bytes)"""
+        if nombre_archivo.lower().endswith((".geojson", ".json")):
+            datos = json.loads(contenido.decode("utf-8"))
+            filas = []
+            for feature in datos.get("features", []):
+                geometria = feature.get("geometry") or {}
+                if geometria.get("type") != "Point":
+                    continue
+                lon, lat = geometria["coordinates"][:2]
+                # Las coordenadas salen de la geometría, no de las propiedades
+                propiedades = {clave: valor for clave, valor in (feature.get("properties") or {}).items()
+                               if _destino_columna(clave) not in ("Latitud", "Longitud")}
+                filas.append({**propiedades, "Latitud": lat, "Longitud": lon})
+            df = pd.DataFrame(filas)
+        else:
+            df = pd.read_csv(BytesIO(contenido))
+        return cls(_normalizar_columnas(df), version=huella_contenido(contenido))
+
+    def en_zona(self, zona):
+        """Posiciones (ordenadas) de las sedes dentro de una zona o círculo"""
+        if es_circulo(zona):
+            return self.indice.consultar_circulo(*datos_circulo(zona))[0]
+        from shapely.geometry import shape
+        return self.indice.consultar(shape(zona["geometry"]))
+
+    def en_zonas(self, zonas):
+        """Matriz (sedes × zonas) de pertenencia"""
+        posiciones, dentro = self.indice.pertenencia_zonas(zonas)
+        matriz = np.zeros((len(self), len(zonas)), dtype=bool)
+        matriz[posiciones] = dentro
+        return matriz
+
+    def tabla(self, posiciones):
+        """Filas del catálogo en el formato de "sedes_afectadas" del reporte"""
+        filas = self.df.iloc[posiciones]
+        return pd.DataFrame({
+            "Nombre": filas["Nombre"].to_numpy(),
+            "Dirección": filas["Dirección"].to_numpy(),
+            "Coordenadas": [[lat, lon] for lat, lon in zip(filas["Latitud"], filas["Longitud"])]
+        })
+
+    def posiciones_asignadas(self, serie):
+        """Posición en el registro de la sede asignada de cada fila (-1 si no existe)
+
+        Solo se comparan los valores distintos (categorías) de la serie; las
+        filas se resuelven con sus códigos enteros.
+        """
+        codigos, categorias = codigos_categoria(serie)
+        por_categoria = np.array(
+            [self._por_nombre.get(_clave_nombre(c), -1) for c in categorias] + [-1],
+            dtype="int64"
+        )
+        return por_categoria[codigos]
+
+    def datos_capa(self):
+        """Filas compactas [lat, lon, nombre, dirección, color, icono] para el mapa"""
+        return self.df[["Latitud", "Longitud", "Nombre", "Dirección", "Color", "Icono"]].to_numpy().tolist()
@@ -0,0 +1,132 @@
+"""Rosters y zonas sintéticos y deterministas para pruebas de escala y benchmarks
+
+La misma semilla produce siempre los mismos datos. Las proporciones de
+ciudad, criticidad y subproceso imitan un roster real: la mayoría en Bogotá
+agrupada por barrios, pocas filas de criticidad alta y unos cuantos
+subprocesos que concentran a casi todos.
+"""
+import numpy as np
+import pandas as pd
+
+from sedes import SEDES_FIJAS
+
+# Cajas (sur, oeste, norte, este) en grados
+CAJA_BOGOTA = (4.47, -74.22, 4.83, -74.00)
+CAJA_COLOMBIA = (-4.2, -79.0, 12.5, -66.9)
+
+# Ciudad: (latitud, longitud, peso, dispersión en grados); Bogotá usa su caja
+CIUDADES = {
+    "Bogotá": (4.65, -74.10, 0.62, None),
+    "Medellín": (6.25, -75.57, 0.12, 0.04),
+    "Cali": (3.44, -76.52, 0.09, 0.04),
+    "Barranquilla": (10.98, -74.80, 0.06, 0.03),
+    "Bucaramanga": (7.12, -73.12, 0.04, 0.03),
+    "Cartagena": (10.40, -75.51, 0.03, 0.03),
+    "Pereira": (4.81, -75.69, 0.02, 0.02),
+    "Otra": (None, None, 0.02, None),
+}
+CRITICIDADES = {"Alta": 0.15, "Media": 0.35, "Baja": 0.50}
+SUBPROCESOS = ["Atención al usuario", "Autorizaciones", "Facturación", "Enfermería", "Medicina general",
+               "Laboratorio clínico", "Imágenes diagnósticas", "Odontología", "Tecnología",
+               "Talento humano", "Contabilidad", "Servicios generales"]
+BARRIOS_BOGOTA = 40  # Núcleos alrededor de los que se agrupan los colaboradores de Bogotá
+METROS_POR_GRADO = 111320
+TIPOS_VIA = np.array(["Calle", "Carrera", "Avenida", "Diagonal", "Transversal"])
+
+
+def _pesos_zipf(cantidad):
+    pesos = 1 / np.arange(1, cantidad + 1)
+    return pesos / pesos.sum()
+
+
+def _en_caja(rng, n, caja):
+    sur, oeste, norte, este = caja
+    return rng.uniform(sur, norte, n), rng.uniform(oeste, este, n)
+
+
+def _coordenadas_bogota(rng, n):
+    # 70 % agrupado alrededor de barrios, el resto repartido en la caja
+    sur, oeste, norte, este = CAJA_BOGOTA
+    barrios_lat, barrios_lon = _en_caja(rng, BARRIOS_BOGOTA, CAJA_BOGOTA)
+    barrio = rng.integers(0, BARRIOS_BOGOTA, n)
+    lat = barrios_lat[barrio] + rng.normal(0, 0.012, n)
+    lon = barrios_lon[barrio] + rng.normal(0, 0.012, n)
+    dispersos = rng.random(n) < 0.3
+    lat[dispersos], lon[dispersos] = _en_caja(rng, dispersos.sum(), CAJA_BOGOTA)
+    return np.clip(lat, sur, norte), np.clip(lon, oeste, este)
+
+
+def generar_roster(n, semilla=0, sin_coordenadas=0.01):
+    """DataFrame de `n` colaboradores con las columnas del CSV de la app
+
+    Una fracción `sin_coordenadas` de las filas trae Latitud/Longitud vacías,
+    como los registros incompletos de un roster real.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres_ciudades = list(CIUDADES)
+    ciudad = rng.choice(len(nombres_ciudades), n, p=[CIUDADES[c][2] for c in nombres_ciudades])
+
+    lat = np.empty(n)
+    lon = np.empty(n)
+    for codigo, nombre in enumerate(nombres_ciudades):
+        filas = np.flatnonzero(ciudad == codigo)
+        centro_lat, centro_lon, _, dispersion = CIUDADES[nombre]
+        if nombre == "Bogotá":
+            lat[filas], lon[filas] = _coordenadas_bogota(rng, len(filas))
+        elif centro_lat is None:
+            lat[filas], lon[filas] = _en_caja(rng, len(filas), CAJA_COLOMBIA)
+        else:
+            lat[filas] = centro_lat + rng.normal(0, dispersion, len(filas))
+            lon[filas] = centro_lon + rng.normal(0, dispersion, len(filas))
+    vacias = rng.random(n) < sin_coordenadas
+    lat[vacias] = np.nan
+    lon[vacias] = np.nan
+
+    sedes = list(SEDES_FIJAS)
+    vias = TIPOS_VIA[rng.integers(0, len(TIPOS_VIA), n)]
+    numeros = rng.integers(1, [200, 150, 99], (n, 3)).tolist()
+    ciudades = np.array(nombres_ciudades, dtype=object)[ciudad]
+    return pd.DataFrame({
+        "Nombre": [f"Colaborador {i:07d}" for i in range(n)],
+        "Dirección": [f"{via} {a} #{b}-{c}, {nombre}" for via, (a, b, c), nombre in zip(vias, numeros, ciudades)],
+        "Sede asignada": np.array(sedes, dtype=object)[rng.choice(len(sedes), n, p=_pesos_zipf(len(sedes)))],
+        "Teléfono": [f"3{numero:09d}" for numero in rng.integers(0, 10 ** 9, n).tolist()],
+        "Ciudad": ciudades,
+        "Subproceso": np.array(SUBPROCESOS, dtype=object)[rng.choice(len(SUBPROCESOS), n,
+                                                                     p=_pesos_zipf(len(SUBPROCESOS)))],
+        "Criticidad": rng.choice(list(CRITICIDADES), n, p=list(CRITICIDADES.values())),
+        "Latitud": lat.round(6),
+        "Longitud": lon.round(6),
+    })
+
+
+def roster_csv(n, semilla=0, sin_coordenadas=0.01):
+    """Roster sintético como bytes CSV, igual que un archivo subido"""
+    return generar_roster(n, semilla, sin_coordenadas).to_csv(index=False).encode("utf-8")
+
+
+def generar_zonas(cantidad, semilla=0, caja=CAJA_BOGOTA, fraccion_circulos=0.5, radio_minimo=500, radio_maximo=3000):
+    """Lista de zonas (Features) al azar dentro de la caja, como las dibuja Leaflet.draw
+
+    Los polígonos tienen entre 5 y 10 vértices alrededor de un centro (siempre
+    son simples); los círculos son un Point con la propiedad radius. Los
+    radios van de `radio_minimo` a `radio_maximo` metros.
+    """
+    rng = np.random.default_rng(semilla)
+    sur, oeste, norte, este = caja
+    zonas = []
+    for i in range(cantidad):
+        lat = rng.uniform(sur, norte)
+        lon = rng.uniform(oeste, este)
+        radio = float(rng.uniform(radio_minimo, radio_maximo))
+        if rng.random() < fraccion_circulos:
+            zonas.append({"type": "Feature", "properties": {"nombre": f"Zona {i + 1}", "radius": radio},
+                          "geometry": {"type": "Point", "coordinates": [lon, lat]}})
+            continue
+        vertices = int(rng.integers(5, 11))
+        angulos = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radios = radio / METROS_POR_GRADO * rng.uniform(0.6, 1.0, vertices)
+        anillo = np.column_stack([lon + radios * np.cos(angulos), lat + radios * np.sin(angulos)]).round(6).tolist()
+        zonas.append({"type": "Feature", "properties": {"nombre": f"Zona {i + 1}"},
+                      "geometry": {"type": "Polygon", "coordinates": [anillo + anillo[:1]]}})
+    return zonas
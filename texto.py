@@ -0,0 +1,63 @@
+"""Utilidades de normalización de texto compartidas por la aplicación"""
+import unicodedata
+
+import numpy as np
+
+from filtros import codigos_categoria
+
+
+class _TablaCombinantes(dict):
+    """Tabla para str.translate que elimina los caracteres combinantes
+
+    Se llena a demanda: cada punto de código se clasifica una sola vez y las
+    búsquedas siguientes se resuelven en C dentro de str.translate.
+    """
+
+    def __missing__(self, codigo):
+        valor = None if unicodedata.combining(chr(codigo)) else codigo
+        self[codigo] = valor
+        return valor
+
+
+_COMBINANTES = _TablaCombinantes()
+
+# Puntuación tipográfica sin equivalente en latin-1 (las fuentes base del PDF)
+_TIPOGRAFICOS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"', "\u2033": '"',
+    "\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2013": "-", "\u2014": "-", "\u2015": "-",
+    "\u2022": "-", "\u2212": "-",
+})
+
+
+def remove_accents(input_str):
+    """Elimina acentos de los caracteres"""
+    if input_str.isascii():
+        return input_str
+    return unicodedata.normalize('NFKD', input_str).translate(_COMBINANTES)
+
+
+def texto_latin1(input_str):
+    """Texto sin acentos y representable en latin-1, para las fuentes base del PDF
+
+    Comillas y guiones tipográficos pasan a sus equivalentes ASCII; cualquier
+    otro carácter fuera de latin-1 se reemplaza por "?".
+    """
+    texto = remove_accents(input_str)
+    if texto.isascii():
+        return texto
+    return texto.translate(_TIPOGRAFICOS).encode("latin-1", "replace").decode("latin-1")
+
+
+def columna_sin_acentos(serie, largo=None):
+    """Aplica texto_latin1 (y un recorte opcional) una vez por valor distinto
+
+    Devuelve un arreglo de textos alineado con la serie; los vacíos quedan
+    como cadena vacía.
+    """
+    codigos, valores = codigos_categoria(serie)
+    limpios = np.array(
+        [texto_latin1(str(valor))[:largo] for valor in valores] + [""],
+        dtype=object
+    )
+    return limpios[codigos]
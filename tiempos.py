@@ -0,0 +1,81 @@
+"""Tiempo y pico de memoria por etapa, para el panel de tiempos y los benchmarks"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+RUTA_ESTADO = "/proc/self/status"
+RUTA_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def memoria_residente():
+    """(actual, pico) de la memoria residente del proceso en bytes, o None fuera de Linux"""
+    try:
+        with open(RUTA_ESTADO) as archivo:
+            valores = {linea.split(":")[0]: int(linea.split()[1]) * 1024
+                       for linea in archivo if linea.startswith(("VmRSS", "VmHWM"))}
+        return valores["VmRSS"], valores["VmHWM"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reiniciar_pico_residente():
+    # Escribir "5" en clear_refs reinicia VmHWM (Linux >= 4.0)
+    try:
+        with open(RUTA_CLEAR_REFS, "w") as archivo:
+            archivo.write("5")
+        return memoria_residente() is not None
+    except OSError:
+        return False
+
+
+class Cronometro:
+    """Duración de cada etapa de una ejecución y, si se pide, su pico de memoria
+
+    El pico es lo que la etapa suma a la memoria residente del proceso
+    (incluye lo que reservan pyarrow y shapely fuera de Python). Donde ese
+    máximo no se puede reiniciar se usa tracemalloc, que solo ve las
+    reservas de Python y numpy.
+    """
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        self.etapas = {}
+        self.datos = {}
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide el bloque; repetir el nombre reemplaza la medición anterior"""
+        medicion = self._iniciar_memoria() if self.memoria else None
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro = {"segundos": time.perf_counter() - inicio}
+            if medicion is not None:
+                registro["memoria_mb"] = self._pico_memoria(*medicion) / 2 ** 20
+            self.etapas[nombre] = registro
+
+    def _iniciar_memoria(self):
+        if _reiniciar_pico_residente():
+            return "residente", memoria_residente()[0]
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return "tracemalloc", tracemalloc.get_traced_memory()[0]
+
+    def _pico_memoria(self, modo, base):
+        pico = memoria_residente()[1] if modo == "residente" else tracemalloc.get_traced_memory()[1]
+        return max(pico - base, 0)
+
+    def anotar(self, nombre, valor):
+        """Guarda un dato adicional de la ejecución (p. ej. tamaño de la carga útil)"""
+        self.datos[nombre] = valor
+
+    def tabla(self):
+        """Etapas medidas, en orden de ejecución, con su duración en milisegundos"""
+        filas = [{"Etapa": nombre, "ms": round(registro["segundos"] * 1000, 1),
+                  **({"Pico MB": round(registro["memoria_mb"], 1)} if "memoria_mb" in registro else {})}
+                 for nombre, registro in self.etapas.items()]
+        return pd.DataFrame(filas)